@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Optional
+
+import anyio.to_thread
+from anyio import CapacityLimiter
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import engine
+from app.tenancy import current_site
+
+PRIORITY_PREFIXES = ("/admin", "/contact")
+# View beacons are counted in memory, with no thread or connection to protect.
+EXEMPT_PREFIXES = ("/static", "/healthz", "/readyz", "/views")
+STALE_PAGES = ("/", "/about", "/learn-more")
+OVERLOADED_MESSAGE = "El sitio está recibiendo muchas visitas. Intenta de nuevo en unos segundos."
+
+_lock = threading.Lock()
+_in_flight: Counter = Counter()
+_counters: Counter = Counter()
+_peak_queue = 0
+_thread_limiter: Optional[CapacityLimiter] = None
+# Last good render of each public page per site, served instead of a 503 while shedding.
+_stale_pages: dict[tuple[str, str], tuple[bytes, str]] = {}
+
+
+def priority_for(path: str) -> str:
+    return "priority" if path.startswith(PRIORITY_PREFIXES) else "public"
+
+
+def pool_usage() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"checked_out": None, "capacity": None, "saturated": False}
+    checked_out = pool.checkedout()
+    # A negative max_overflow means the pool never blocks.
+    capacity = pool.size() + pool._max_overflow if pool._max_overflow >= 0 else None
+    return {
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "saturated": capacity is not None and checked_out >= capacity,
+    }
+
+
+def threadpool_usage() -> dict:
+    global _thread_limiter
+    if _thread_limiter is None:
+        # Only reachable from the event loop; sync routes read the remembered limiter.
+        _thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = _thread_limiter.statistics()
+    return {
+        "borrowed": statistics.borrowed_tokens,
+        "capacity": int(statistics.total_tokens),
+        "queued": statistics.tasks_waiting,
+    }
+
+
+def _shed_reason(priority: str, threads: dict, pool: dict) -> Optional[str]:
+    if threads["queued"] >= settings.admission_max_queue:
+        return "queue_full"
+    if priority == "priority":
+        return None
+    # Anonymous traffic never takes the threads kept back for the admin and contact form.
+    if _in_flight["public"] >= threads["capacity"] - settings.admission_reserved_threads:
+        return "public_limit"
+    if threads["queued"] >= settings.admission_shed_queue:
+        return "queue_depth"
+    if pool["saturated"]:
+        return "pool_saturated"
+    return None
+
+
+def admission_stats() -> dict:
+    """Per-worker snapshot for the admin dashboard; every worker keeps its own counters."""
+    threads = threadpool_usage()
+    with _lock:
+        return {
+            "in_flight": dict(_in_flight),
+            "queue_depth": threads["queued"],
+            "peak_queue_depth": _peak_queue,
+            "threadpool": threads,
+            "db_pool": pool_usage(),
+            "admitted": _counters["admitted"],
+            "rejected": {key[len("rejected:"):]: value for key, value in _counters.items() if key.startswith("rejected:")},
+            "served_stale": _counters["served_stale"],
+            "stale_pages": sorted(f"{site}{path}" for site, path in _stale_pages),
+        }
+
+
+def _overloaded_response(path: str) -> tuple[int, list, bytes]:
+    headers = [(b"retry-after", str(settings.admission_retry_after).encode()), (b"cache-control", b"no-store")]
+    if path.startswith("/api/"):
+        body = b'{"error":"overloaded","detail":"Server is busy, retry later"}'
+        headers.append((b"content-type", b"application/json"))
+    else:
+        body = OVERLOADED_MESSAGE.encode("utf-8")
+        headers.append((b"content-type", b"text/plain; charset=utf-8"))
+    return 503, headers, body
+
+
+def _stale_response(body: bytes, content_type: str) -> tuple[int, list, bytes]:
+    headers = [
+        (b"content-type", content_type.encode("latin-1")),
+        (b"cache-control", b"no-store"),
+        (b"x-served-stale", b"1"),
+    ]
+    return 200, headers, body
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds anonymous page views early, before they queue behind the threadpool or the
+    database pool, so `/admin` and `/contact` keep working through a traffic spike.
+    Shed page views get the last good render of the page when one exists, else a 503
+    with `Retry-After`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _peak_queue
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        priority = priority_for(path)
+        threads = threadpool_usage()
+        with _lock:
+            _peak_queue = max(_peak_queue, threads["queued"])
+            reason = _shed_reason(priority, threads, pool_usage())
+            if reason:
+                _counters[f"rejected:{reason}"] += 1
+                stale = _stale_pages.get((current_site(), path)) if scope["method"] == "GET" else None
+                if stale:
+                    _counters["served_stale"] += 1
+            else:
+                _counters["admitted"] += 1
+                _in_flight[priority] += 1
+
+        if reason:
+            status, headers, body = _stale_response(*stale) if stale else _overloaded_response(path)
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            if path in STALE_PAGES and scope["method"] == "GET" and not scope.get("query_string"):
+                await self.app(scope, receive, self._remembering((current_site(), path), send))
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            with _lock:
+                _in_flight[priority] -= 1
+
+    @staticmethod
+    def _remembering(page: tuple[str, str], send: Send) -> Send:
+        chunks: list[bytes] = []
+        content_type: Optional[str] = None
+
+        async def send_and_remember(message: Message) -> None:
+            nonlocal content_type
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type" and value.startswith(b"text/html"):
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body" and content_type:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    with _lock:
+                        _stale_pages[page] = (b"".join(chunks), content_type)
+            await send(message)
+
+        return send_and_remember
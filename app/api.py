@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import get_read_db, primary_reads
+from app.invalidation import content_version
+from app.models import Post, Service, SiteSettings, TeamMember
+from app.tenancy import current_site
+
+router = APIRouter(prefix="/api/v1")
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_CACHED_RESPONSES = 256
+CACHE_CONTROL = "public, max-age=60"
+
+SERVICE_FIELDS = {
+    "id": Service.id,
+    "title": Service.title,
+    "description": Service.description,
+    "key_points": Service.key_points_items,
+}
+TEAM_FIELDS = {
+    "id": TeamMember.id,
+    "name": TeamMember.name,
+    "role": TeamMember.role,
+    "bio": TeamMember.bio,
+    "image_url": TeamMember.image_url,
+}
+POST_FIELDS = {
+    "id": Post.id,
+    "title": Post.title,
+    "description": Post.description,
+    "description_html": Post.description_html,
+    "excerpt": Post.excerpt,
+    "content_type": Post.content_type,
+    "content_url": Post.content_url,
+    "embed_url": Post.embed_url,
+    "poster_url": Post.poster_url,
+    "created_at": Post.created_at,
+    "updated_at": Post.updated_at,
+}
+SITE_FIELDS = {
+    "contact_email": SiteSettings.contact_email,
+    "whatsapp_number": SiteSettings.whatsapp_number,
+    "whatsapp_url": SiteSettings.whatsapp_url,
+    "phone_number": SiteSettings.phone_number,
+    "address_text": SiteSettings.address_text,
+    "social_facebook": SiteSettings.social_facebook,
+    "social_instagram": SiteSettings.social_instagram,
+    "social_x": SiteSettings.social_x,
+    "social_linkedin": SiteSettings.social_linkedin,
+}
+
+_responses: "OrderedDict[tuple, tuple[bytes, str]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+class ApiError(Exception):
+    def __init__(self, code: str, detail: str) -> None:
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+
+def _select_fields(request: Request, available: dict) -> list[str]:
+    requested = request.query_params.get("fields")
+    if not requested:
+        return list(available)
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError("unknown_field", f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def _limit(request: Request) -> int:
+    raw = request.query_params.get("limit")
+    if not raw:
+        return DEFAULT_LIMIT
+    if not raw.isdigit() or not 1 <= int(raw) <= MAX_LIMIT:
+        raise ApiError("invalid_limit", f"limit must be between 1 and {MAX_LIMIT}")
+    return int(raw)
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(_dumps(values)).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(request: Request) -> Optional[list]:
+    raw = request.query_params.get("cursor")
+    if not raw:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+    except ValueError:
+        raise ApiError("invalid_cursor", "cursor is not valid") from None
+    if not isinstance(values, list) or not values:
+        raise ApiError("invalid_cursor", "cursor is not valid")
+    return values
+
+
+def _id_page(db: Session, request: Request, model, available: dict, newest_first: bool = False, where=None) -> dict:
+    names = _select_fields(request, available)
+    limit = _limit(request)
+    cursor = _decode_cursor(request)
+    statement = select(*[available[name].label(name) for name in names], model.id.label("_id"))
+    if where is not None:
+        statement = statement.where(where)
+    if cursor:
+        if not isinstance(cursor[0], int):
+            raise ApiError("invalid_cursor", "cursor is not valid")
+        statement = statement.where(model.id < cursor[0] if newest_first else model.id > cursor[0])
+    statement = statement.order_by(model.id.desc() if newest_first else model.id).limit(limit + 1)
+
+    rows = db.execute(statement).mappings().all()
+    next_cursor = _encode_cursor([rows[limit - 1]["_id"]]) if len(rows) > limit else None
+    return {"data": [{name: row[name] for name in names} for row in rows[:limit]], "next_cursor": next_cursor}
+
+
+def _cached_json(request: Request, db: Session, topics: tuple[str, ...], build: Callable[[], Any]) -> Response:
+    key = (
+        current_site(),
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        content_version(*topics),
+    )
+    with _lock:
+        cached = _responses.get(key)
+        if cached:
+            _responses.move_to_end(key)
+
+    if cached is None:
+        try:
+            with primary_reads(db):
+                body = _dumps(build())
+        except ApiError as exc:
+            return Response(_dumps({"error": exc.code, "detail": exc.detail}), status_code=400, media_type="application/json")
+        cached = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        with _lock:
+            _responses[key] = cached
+            while len(_responses) > MAX_CACHED_RESPONSES:
+                _responses.popitem(last=False)
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/services")
+def api_services(request: Request, db: Session = Depends(get_read_db)):
+    return _cached_json(request, db, (Service.__tablename__,), lambda: _id_page(db, request, Service, SERVICE_FIELDS))
+
+
+@router.get("/team")
+def api_team(request: Request, db: Session = Depends(get_read_db)):
+    return _cached_json(request, db, (TeamMember.__tablename__,), lambda: _id_page(db, request, TeamMember, TEAM_FIELDS))
+
+
+@router.get("/posts")
+def api_posts(request: Request, db: Session = Depends(get_read_db)):
+    return _cached_json(
+        request,
+        db,
+        (Post.__tablename__,),
+        lambda: _id_page(db, request, Post, POST_FIELDS, newest_first=True, where=Post.is_published == True),
+    )
+
+
+@router.get("/site")
+def api_site(request: Request, db: Session = Depends(get_read_db)):
+    def build():
+        names = _select_fields(request, SITE_FIELDS)
+        row = db.execute(select(*[SITE_FIELDS[name].label(name) for name in names]).limit(1)).mappings().first()
+        return {"data": dict(row) if row else {}}
+
+    return _cached_json(request, db, (SiteSettings.__tablename__,), build)
@@ -1,22 +1,40 @@
 ﻿from __future__ import annotations
 
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session
 
 from app.models import Admin
+from app.tenancy import current_site
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+@lru_cache(maxsize=1)
+def password_context() -> "CryptContext":
+    # passlib is only needed on login and admin changes, so it is imported then.
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(password, hashed_password)
+    return password_context().verify(password, hashed_password)
+
+
+def site_admins(db: Session) -> Query:
+    """Admins who may sign in on the current site: its own plus the operators of every site."""
+    return db.query(Admin).filter(or_(Admin.site_key.is_(None), Admin.site_key == current_site()))
 
 
 def get_admin_from_session(db: Session, admin_id: int | None) -> Admin | None:
     if not admin_id:
         return None
-    return db.query(Admin).filter(Admin.id == admin_id).first()
+    return site_admins(db).filter(Admin.id == admin_id).first()
@@ -1,6 +1,7 @@
 ﻿from __future__ import annotations
 
 import os
+import tempfile
 from pathlib import Path
 from typing import Optional
 
@@ -18,10 +19,16 @@ def normalize_database_url(url: str) -> str:
 
 class Settings:
     app_name: str = os.getenv("APP_NAME", "Agencia Contable")
+    site_url: Optional[str] = os.getenv("SITE_URL")
+    default_site_key: str = os.getenv("DEFAULT_SITE_KEY", "default")
     secret_key: str = os.getenv("SECRET_KEY", "change-this-secret")
     database_url: str = normalize_database_url(
         os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR / 'app.db'}")
     )
+    database_replica_url: Optional[str] = (
+        normalize_database_url(os.getenv("DATABASE_REPLICA_URL", "")) or None
+    )
+    replica_sticky_seconds: int = int(os.getenv("REPLICA_STICKY_SECONDS", "15"))
 
     super_admin_username: str = os.getenv("SUPER_ADMIN_USERNAME", "superadmin")
     super_admin_password: str = os.getenv("SUPER_ADMIN_PASSWORD", "ChangeMe123!")
@@ -34,8 +41,49 @@ class Settings:
 
     firebase_credentials: Optional[str] = os.getenv("FIREBASE_CREDENTIALS")
     firebase_bucket: Optional[str] = os.getenv("FIREBASE_BUCKET")
+    upload_url_ttl: int = int(os.getenv("UPLOAD_URL_TTL", "900"))
+    upload_max_bytes: int = int(os.getenv("UPLOAD_MAX_MB", "512")) * 1024 * 1024
 
     admin_session_key: str = os.getenv("ADMIN_SESSION_KEY", "admin_session")
+    public_cache_seconds: int = int(os.getenv("PUBLIC_CACHE_SECONDS", "60"))
+
+    warm_pool_connections: int = int(os.getenv("WARM_POOL_CONNECTIONS", "2"))
+
+    contact_retention_days: int = int(os.getenv("CONTACT_RETENTION_DAYS", "365"))
+    retention_batch_size: int = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    retention_pause: float = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.2"))
+
+    view_flush_interval: float = float(os.getenv("VIEW_FLUSH_SECONDS", "5"))
+
+    invalidation_poll_interval: float = float(os.getenv("INVALIDATION_POLL_SECONDS", "2"))
+
+    server_host: str = os.getenv("HOST", "0.0.0.0")
+    server_port: int = int(os.getenv("PORT", "8000"))
+    web_concurrency: Optional[int] = int(os.getenv("WEB_CONCURRENCY", "0")) or None
+    worker_memory_mb: int = int(os.getenv("WORKER_MEMORY_MB", "256"))
+    max_workers: int = int(os.getenv("MAX_WORKERS", "8"))
+    worker_max_requests: int = int(os.getenv("WORKER_MAX_REQUESTS", "2000"))
+    worker_max_requests_jitter: int = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "200"))
+    worker_timeout: int = int(os.getenv("WORKER_TIMEOUT", "60"))
+    graceful_timeout: int = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+    server_pidfile: str = os.getenv("SERVER_PIDFILE", os.path.join(tempfile.gettempdir(), "agencia-contable.pid"))
+
+    admission_reserved_threads: int = int(os.getenv("ADMISSION_RESERVED_THREADS", "8"))
+    admission_shed_queue: int = int(os.getenv("ADMISSION_SHED_QUEUE", "8"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    admission_retry_after: int = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+    profiler_interval: float = float(os.getenv("PROFILER_INTERVAL_SECONDS", "0.005"))
+    profiler_max_seconds: int = int(os.getenv("PROFILER_MAX_SECONDS", "300"))
+    profiler_keep: int = int(os.getenv("PROFILER_KEEP", "10"))
+
+    # Share of requests traced, from 0 (off) to 1 (all).
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    # A file path for OTLP/JSON lines, or an OTLP/HTTP collector URL.
+    trace_export: str = os.getenv("TRACE_EXPORT", os.path.join(tempfile.gettempdir(), "agencia-contable-traces.jsonl"))
+    trace_service_name: str = os.getenv("TRACE_SERVICE_NAME", "agencia-contable")
+    trace_export_interval: float = float(os.getenv("TRACE_EXPORT_SECONDS", "2"))
+    trace_queue_size: int = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
 
 
 settings = Settings()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine
+from app.invalidation import content_version
+from app.models import PageView, Post
+from app.tenancy import current_site
+
+logger = logging.getLogger(__name__)
+
+MAX_POSTS_PER_BEACON = 50
+# Distinct (site, path) and (site, post id) keys held between flushes; new keys past it are dropped.
+MAX_PENDING_KEYS = 10_000
+
+_lock = threading.Lock()
+# Views seen by this worker since the last flush: (site, path) and (site, post id).
+_pages: Counter = Counter()
+_posts: Counter = Counter()
+_flusher: "ViewFlusher | None" = None
+# Per site: (version, ids of published posts).
+_published: dict[str, tuple[int, frozenset[int]]] = {}
+
+
+def _count(counter: Counter, key: tuple) -> None:
+    if key in counter or len(counter) < MAX_PENDING_KEYS:
+        counter[key] += 1
+
+
+def published_post_ids() -> frozenset[int]:
+    """Ids of the current site's published posts, reloaded when its posts change."""
+    site = current_site()
+    version = content_version(Post.__tablename__)
+    cached = _published.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+    with engine.connect() as conn:
+        ids = frozenset(
+            conn.execute(select(Post.id).where(Post.site_key == site, Post.is_published == True)).scalars()
+        )
+    _published[site] = (version, ids)
+    return ids
+
+
+def record_page_view(path: str) -> None:
+    with _lock:
+        _count(_pages, (current_site(), path))
+
+
+def record_post_views(post_ids: Iterable[int]) -> None:
+    """Counts views of the given posts; ids that are not published posts of the site are ignored."""
+    site = current_site()
+    published = published_post_ids()
+    with _lock:
+        for post_id in post_ids:
+            if post_id in published:
+                _count(_posts, (site, post_id))
+
+
+def _increment_posts(conn: Connection, posts: Counter) -> None:
+    table = Post.__table__
+    increment = case(
+        *((and_(table.c.site_key == site, table.c.id == post_id), views) for (site, post_id), views in posts.items()),
+        else_=0,
+    )
+    conn.execute(
+        update(table)
+        .where(
+            table.c.site_key.in_({site for site, _post_id in posts}),
+            table.c.id.in_({post_id for _site, post_id in posts}),
+        )
+        # Keep updated_at: a view is not an edit, and the feed and sitemap read it.
+        .values(view_count=func.coalesce(table.c.view_count, 0) + increment, updated_at=table.c.updated_at)
+    )
+
+
+def _upsert_pages(conn: Connection, pages: Counter) -> None:
+    table = PageView.__table__
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(
+        [{"site_key": site, "path": path, "views": views} for (site, path), views in pages.items()]
+    )
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.site_key, table.c.path],
+            set_={"views": table.c.views + statement.excluded.views},
+        )
+    )
+
+
+def flush_views() -> int:
+    """
+    Writes the views counted since the last flush: one UPDATE for all posts and one
+    upsert for all pages, in a single transaction. On failure the counts are kept for
+    the next flush.
+    """
+    global _pages, _posts
+    with _lock:
+        pages, posts = _pages, _posts
+        _pages, _posts = Counter(), Counter()
+    if not pages and not posts:
+        return 0
+    try:
+        with engine.begin() as conn:
+            if posts:
+                _increment_posts(conn, posts)
+            if pages:
+                _upsert_pages(conn, pages)
+    except Exception:
+        with _lock:
+            _pages.update(pages)
+            _posts.update(posts)
+        raise
+    return sum(pages.values()) + sum(posts.values())
+
+
+def page_view_counts(db: Session) -> list[PageView]:
+    return db.query(PageView).order_by(PageView.views.desc(), PageView.path).all()
+
+
+class ViewFlusher(threading.Thread):
+    """
+    Flushes this worker's view counts every `view_flush_interval` seconds and once more
+    on shutdown. A crash loses at most one interval of views.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(name="view-flusher", daemon=True)
+        self.interval = settings.view_flush_interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                flush_views()
+            except Exception:
+                logger.exception("Flushing view counts failed; retrying")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.stopped.set()
+        self.join(timeout)
+        try:
+            flush_views()
+        except Exception:
+            logger.exception("Final flush of view counts failed")
+
+
+def start_flusher() -> None:
+    global _flusher
+    if _flusher is None:
+        _flusher = ViewFlusher()
+        _flusher.start()
+
+
+def stop_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        _flusher.stop(timeout=settings.view_flush_interval)
+        _flusher = None
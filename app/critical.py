@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
+
+from jinja2 import pass_context
+from jinja2.runtime import Context
+from markupsafe import Markup
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.sessions import is_admin_path
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / "static"
+TEMPLATES_DIR = BASE_DIR / "templates"
+FONTS_DIR = STATIC_DIR / "fonts"
+FONTS_CSS = FONTS_DIR / "fonts.css"
+
+MAIN_CSS_URL = "/static/css/main.css?v=5"
+MAIN_JS_URL = "/static/js/main.js?v=4"
+GOOGLE_FONTS_URL = (
+    "https://fonts.googleapis.com/css2?family=Space+Grotesk:wght@400;500;600"
+    "&family=Sora:wght@300;400;500;600&display=swap"
+)
+FONT_SUBSETS = ("latin", "latin-ext")
+# Google serves woff2 with unicode-range subsets only to browsers it recognises.
+FONT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# Classes that main.js toggles after load; their rules must be inlined too.
+STATE_CLASSES = {"active", "is-visible", "is-active", "is-open", "is-single", "is-paused", "is-updating", "is-leaving"}
+ALWAYS_MATCH = {"html", "body", "head"}
+
+CssRule = tuple[str, Union[str, list]]
+
+
+def _strip_comments(css: str) -> str:
+    return re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+
+
+def parse_css(css: str) -> list[CssRule]:
+    rules: list[CssRule] = []
+    position = 0
+    while True:
+        brace = css.find("{", position)
+        if brace == -1:
+            return rules
+        prelude = css[position:brace].rsplit(";", 1)[-1].strip()
+        depth, end = 1, brace + 1
+        while depth and end < len(css):
+            if css[end] == "{":
+                depth += 1
+            elif css[end] == "}":
+                depth -= 1
+            end += 1
+        body = css[brace + 1 : end - 1]
+        if prelude.startswith(("@media", "@supports")):
+            rules.append((prelude, parse_css(body)))
+        else:
+            rules.append((prelude, body.strip()))
+        position = end
+
+
+class UsedMarkup:
+    def __init__(self, markup: str) -> None:
+        self.classes: set[str] = set(STATE_CLASSES)
+        for value in re.findall(r'class="([^"]*)"', markup):
+            self.classes.update(re.findall(r"[A-Za-z0-9_-]+", value))
+        self.ids = set(re.findall(r'id="([A-Za-z0-9_-]+)"', markup))
+        self.tags = {tag.lower() for tag in re.findall(r"<([a-zA-Z][a-zA-Z0-9]*)", markup)} | ALWAYS_MATCH
+        self.attributes: set[str] = set()
+        for tag in re.findall(r"<[a-zA-Z][^>]*>", markup):
+            self.attributes.update(re.findall(r"\s([a-zA-Z][a-zA-Z0-9-]*)(?==|\s|/?>)", tag))
+
+    def matches(self, selector: str) -> bool:
+        simple = re.sub(r":not\([^)]*\)", "", selector)
+        simple = re.sub(r"::?[a-zA-Z-]+(\([^)]*\))?", "", simple)
+        classes = re.findall(r"\.([A-Za-z0-9_-]+)", simple)
+        ids = re.findall(r"#([A-Za-z0-9_-]+)", simple)
+        attributes = re.findall(r"\[([A-Za-z0-9_-]+)", simple)
+        tags = re.findall(r"(?:^|[\s>+~])([a-z][a-z0-9]*)", re.sub(r"\[[^\]]*\]", "", simple))
+        return (
+            all(name in self.classes for name in classes)
+            and all(name in self.ids for name in ids)
+            and all(name in self.attributes for name in attributes)
+            and all(name in self.tags for name in tags)
+        )
+
+
+def _select_rules(rules: list[CssRule], used: UsedMarkup) -> list[CssRule]:
+    selected: list[CssRule] = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            nested = _select_rules(body, used)
+            if nested:
+                selected.append((prelude, nested))
+        elif prelude.startswith("@font-face"):
+            selected.append((prelude, body))
+        elif prelude.startswith("@"):
+            continue
+        elif any(used.matches(selector.strip()) for selector in prelude.split(",")):
+            selected.append((prelude, body))
+    return selected
+
+
+def _referenced_keyframes(rules: list[CssRule], selected_css: str) -> list[CssRule]:
+    keyframes = []
+    for prelude, body in rules:
+        if prelude.startswith("@keyframes"):
+            name = prelude.split(None, 1)[-1].strip()
+            if re.search(rf"animation[^;]*\b{re.escape(name)}\b", selected_css):
+                keyframes.append((prelude, body))
+    return keyframes
+
+
+def serialize_css(rules: list[CssRule]) -> str:
+    parts = []
+    for prelude, body in rules:
+        inner = serialize_css(body) if isinstance(body, list) else body
+        parts.append(f"{prelude}{{{inner}}}")
+    css = "".join(parts)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};])\s*", r"\1", css)
+
+
+def above_the_fold(template_name: str) -> str:
+    """Base header markup plus the first section of the page's content block."""
+    base = (TEMPLATES_DIR / "base.html").read_text(encoding="utf-8-sig")
+    page = (TEMPLATES_DIR / template_name).read_text(encoding="utf-8-sig")
+    header = base.split("<main>", 1)[0]
+    content = page.split("{% block content %}", 1)[-1]
+    first_section_end = content.find("</section>")
+    if first_section_end != -1:
+        content = content[: first_section_end + len("</section>")]
+    return header + content
+
+
+@lru_cache(maxsize=None)
+def extract_critical_css(template_name: str) -> str:
+    css = _strip_comments((STATIC_DIR / "css" / "main.css").read_text(encoding="utf-8-sig"))
+    rules = parse_css(css)
+    selected = serialize_css(_select_rules(rules, UsedMarkup(above_the_fold(template_name))))
+    return selected + serialize_css(_referenced_keyframes(rules, selected))
+
+
+@lru_cache(maxsize=1)
+def self_hosted_fonts() -> str:
+    if not FONTS_CSS.is_file():
+        return ""
+    return serialize_css(parse_css(_strip_comments(FONTS_CSS.read_text(encoding="utf-8"))))
+
+
+@lru_cache(maxsize=1)
+def font_preloads() -> tuple[str, ...]:
+    if not FONTS_CSS.is_file():
+        return ()
+    css = FONTS_CSS.read_text(encoding="utf-8")
+    # Only the basic latin files are needed for first paint; latin-ext loads on demand.
+    urls = re.findall(r"/\* latin \*/\s*@font-face\s*{[^}]*url\((/static/fonts/[^)]+)\)", css)
+    return tuple(dict.fromkeys(urls))
+
+
+@pass_context
+def critical_css(context: Context) -> Markup:
+    return Markup(extract_critical_css(context.name))
+
+
+def preload_link_header() -> str:
+    links = [f"<{MAIN_CSS_URL}>; rel=preload; as=style", f"<{MAIN_JS_URL}>; rel=preload; as=script"]
+    links.extend(f"<{url}>; rel=preload; as=font; type=font/woff2; crossorigin" for url in font_preloads())
+    if not font_preloads():
+        links.append("<https://fonts.gstatic.com>; rel=preconnect; crossorigin")
+    return ", ".join(links)
+
+
+class PreloadLinkMiddleware:
+    """
+    Adds `Link: rel=preload` for the deferred stylesheet, script and fonts to public HTML
+    responses. Proxies that support 103 Early Hints (Cloudflare, Fastly) can replay it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.header = preload_link_header()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET" or is_admin_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_links(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                if headers.get("content-type", "").startswith("text/html"):
+                    headers.append("link", self.header)
+            await send(message)
+
+        await self.app(scope, receive, send_with_links)
+
+
+def _download(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": FONT_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def fetch_fonts() -> None:
+    """Downloads the latin subsets of the site fonts into static/fonts and writes fonts.css."""
+    css = _download(GOOGLE_FONTS_URL).decode("utf-8")
+    FONTS_DIR.mkdir(parents=True, exist_ok=True)
+    kept = []
+    for subset, block in re.findall(r"/\* ([a-z-]+) \*/\s*(@font-face\s*{[^}]*})", css):
+        if subset not in FONT_SUBSETS:
+            continue
+        family = re.search(r"font-family:\s*'([^']+)'", block).group(1)
+        remote = re.search(r"url\((https://[^)]+\.woff2)\)", block).group(1)
+        # Variable fonts reuse one file for every weight, so name files by source URL.
+        digest = hashlib.sha1(remote.encode()).hexdigest()[:10]
+        filename = f"{family.lower().replace(' ', '-')}-{subset}-{digest}.woff2"
+        target = FONTS_DIR / filename
+        if not target.exists():
+            target.write_bytes(_download(remote))
+        kept.append(f"/* {subset} */\n" + block.replace(remote, f"/static/fonts/{filename}"))
+    FONTS_CSS.write_text("\n".join(kept) + "\n", encoding="utf-8")
+    print(f"Wrote {len(kept)} font faces to {FONTS_CSS}")
+
+
+def report() -> None:
+    full = len((STATIC_DIR / "css" / "main.css").read_bytes())
+    for name in ("index.html", "about.html", "learn_more.html"):
+        print(f"{name}: {len(extract_critical_css(name))} bytes inlined of {full}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "fetch-fonts":
+        fetch_fonts()
+    elif command == "report":
+        report()
+    else:
+        sys.exit("usage: python -m app.critical [fetch-fonts|report]")
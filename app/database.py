@@ -1,23 +1,76 @@
 ﻿from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config import settings
+from app.sessions import ADMIN_PREFIX, is_admin_path
+
+PRIMARY_COOKIE = "read_primary_until"
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def _connect_args() -> dict:
-    if settings.database_url.startswith("sqlite"):
+def _connect_args(url: str) -> dict:
+    if url.startswith("sqlite"):
         return {"check_same_thread": False}
     return {}
 
 
-engine = create_engine(settings.database_url, connect_args=_connect_args())
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(settings.database_url, connect_args=_connect_args(settings.database_url))
+replica_engine = (
+    create_engine(settings.database_replica_url, connect_args=_connect_args(settings.database_replica_url))
+    if settings.database_replica_url
+    else None
+)
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to the replica when the session is marked read-only. Any flush pins the
+    rest of the session to the primary, so writes and the reads that follow them agree.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            replica_engine is not None
+            and self.info.get("read_only")
+            and not self.info.get("use_primary")
+            and not self._flushing
+        ):
+            return replica_engine
+        return engine
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _pin_to_primary(session: Session, _flush_context, _instances) -> None:
+    session.info["use_primary"] = True
+
+
+@contextmanager
+def primary_reads(db: Session) -> Iterator[Session]:
+    """
+    Reads inside the block go to the primary. Use it when filling a cache keyed on
+    content versions, so replica lag is never stored under a newer version.
+    """
+    previous = db.info.get("use_primary")
+    db.info["use_primary"] = True
+    try:
+        yield db
+    finally:
+        db.info["use_primary"] = previous
 
 
 def get_db():
@@ -26,3 +79,51 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _reads_pinned(request: Request) -> bool:
+    # Only admin pages read the cookie; public pages must not vary by cookie.
+    if not is_admin_path(request.url.path):
+        return False
+    until: Optional[str] = request.cookies.get(PRIMARY_COOKIE)
+    return bool(until and until.isdigit() and int(until) > time.time())
+
+
+def get_read_db(request: Request):
+    db = SessionLocal()
+    db.info["read_only"] = not _reads_pinned(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class ReadYourWritesMiddleware:
+    """
+    After an admin write, pins that browser's admin reads to the primary for
+    `replica_sticky_seconds` so it sees its own changes despite replica lag.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            replica_engine is None
+            or scope["type"] != "http"
+            or scope["method"] in {"GET", "HEAD", "OPTIONS"}
+            or not is_admin_path(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time()) + settings.replica_sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until}; Max-Age={settings.replica_sticky_seconds}; Path={ADMIN_PREFIX}; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models import AboutContent, Post, Service, SiteSettings
+from app.richtext import plain_excerpt, render_markdown
+from app.utils import maps_embed_url, split_key_points, whatsapp_link, youtube_embed_url, youtube_poster_url
+
+
+def refresh_site_settings(row: SiteSettings) -> None:
+    row.whatsapp_url = whatsapp_link(row.whatsapp_number)
+
+
+def refresh_about_content(row: AboutContent) -> None:
+    row.location_embed_url = maps_embed_url(row.location_map_url)
+
+
+def refresh_service(row: Service) -> None:
+    row.key_points_items = split_key_points(row.key_points)
+
+
+def refresh_post(row: Post) -> None:
+    is_youtube = row.content_type == "youtube"
+    row.embed_url = youtube_embed_url(row.content_url) if is_youtube else ""
+    row.poster_url = youtube_poster_url(row.content_url) if is_youtube else ""
+    row.description_html = render_markdown(row.description)
+    row.excerpt = plain_excerpt(row.description_html)
+
+
+def backfill_derived_fields(db: Session) -> None:
+    for row in db.query(SiteSettings).filter(SiteSettings.whatsapp_url.is_(None)):
+        refresh_site_settings(row)
+    for row in db.query(AboutContent).filter(AboutContent.location_embed_url.is_(None)):
+        refresh_about_content(row)
+    for row in db.query(Service).filter(Service.key_points_items.is_(None)):
+        refresh_service(row)
+    for row in db.query(Post).filter(
+        or_(Post.embed_url.is_(None), Post.poster_url.is_(None), Post.description_html.is_(None), Post.excerpt.is_(None))
+    ):
+        refresh_post(row)
+    db.commit()
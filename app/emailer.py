@@ -1,15 +1,17 @@
 ﻿from __future__ import annotations
 
-import smtplib
-from email.message import EmailMessage
-
 from app.config import settings
+from app.tracing import KIND_CLIENT, span
 
 
 def send_contact_email(to_email: str, name: str, email: str, message: str) -> tuple[bool, str]:
     if not settings.smtp_host or not settings.smtp_user or not settings.smtp_password:
         return False, "SMTP not configured"
 
+    # Imported here: most requests never send mail.
+    import smtplib
+    from email.message import EmailMessage
+
     sender = settings.smtp_from or settings.smtp_user
 
     msg = EmailMessage()
@@ -18,11 +20,18 @@ def send_contact_email(to_email: str, name: str, email: str, message: str) -> tu
     msg["To"] = to_email
     msg.set_content(f"Nombre: {name}\nEmail: {email}\n\nMensaje:\n{message}")
 
-    try:
-        with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as server:
-            server.starttls()
-            server.login(settings.smtp_user, settings.smtp_password)
-            server.send_message(msg)
-        return True, "Sent"
-    except Exception as exc:  # pragma: no cover - depends on SMTP
-        return False, f"Error: {exc}"
+    with span("send_contact_email", **{"server.address": settings.smtp_host}) as email_span:
+        try:
+            with span("smtp.connect", KIND_CLIENT):
+                server = smtplib.SMTP(settings.smtp_host, settings.smtp_port)
+            with server:
+                with span("smtp.starttls", KIND_CLIENT):
+                    server.starttls()
+                with span("smtp.login", KIND_CLIENT):
+                    server.login(settings.smtp_user, settings.smtp_password)
+                with span("smtp.send_message", KIND_CLIENT):
+                    server.send_message(msg)
+            return True, "Sent"
+        except Exception as exc:  # pragma: no cover - depends on SMTP
+            email_span.record_exception(exc)
+            return False, f"Error: {exc}"
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from xml.etree import ElementTree as ET
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.invalidation import content_version
+from app.models import GeneratedDocument, LearnMoreContent, Post
+from app.tenancy import current_site, site_hosts
+from app.ui_copy import get_ui_copy
+
+SITEMAP = "sitemap.xml"
+FEED = "feed.xml"
+PUBLIC_PAGES = ("/", "/about", "/learn-more")
+ATOM_NS = "http://www.w3.org/2005/Atom"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+CACHE_CONTROL = "public, max-age=300"
+
+_cached: dict[str, tuple[int, Any]] = {}
+
+
+def site_base_url() -> Optional[str]:
+    """
+    Absolute URL of the current site from configuration only: SITE_URL for the default
+    site, otherwise its first registered host. Never the Host header, since the
+    documents built from it are stored and served to everyone.
+    """
+    site = current_site()
+    if site == settings.default_site_key and settings.site_url:
+        return settings.site_url.rstrip("/")
+    hosts = site_hosts(site)
+    return f"https://{hosts[0]}" if hosts else None
+
+
+def document_name(name: str) -> str:
+    return f"{current_site()}/{name}"
+
+
+def _utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc).replace(microsecond=0)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _iso(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _serialize(root: ET.Element) -> bytes:
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def build_sitemap(posts: list[Post], base_url: str) -> bytes:
+    ET.register_namespace("", SITEMAP_NS)
+    root = ET.Element(f"{{{SITEMAP_NS}}}urlset")
+    latest_post = max((_utc(post.updated_at) for post in posts), default=None)
+    for path in PUBLIC_PAGES:
+        url = ET.SubElement(root, f"{{{SITEMAP_NS}}}url")
+        ET.SubElement(url, f"{{{SITEMAP_NS}}}loc").text = f"{base_url}{path}"
+        if path == "/learn-more" and latest_post:
+            ET.SubElement(url, f"{{{SITEMAP_NS}}}lastmod").text = _iso(latest_post)
+    return _serialize(root)
+
+
+def build_feed(posts: list[Post], base_url: str, title: str, subtitle: str) -> bytes:
+    ET.register_namespace("", ATOM_NS)
+    root = ET.Element(f"{{{ATOM_NS}}}feed")
+    ET.SubElement(root, f"{{{ATOM_NS}}}title").text = title
+    ET.SubElement(root, f"{{{ATOM_NS}}}subtitle").text = subtitle
+    ET.SubElement(root, f"{{{ATOM_NS}}}id").text = f"{base_url}/learn-more"
+    ET.SubElement(root, f"{{{ATOM_NS}}}link", href=f"{base_url}/learn-more")
+    ET.SubElement(root, f"{{{ATOM_NS}}}link", rel="self", href=f"{base_url}/{FEED}")
+    updated = max((_utc(post.updated_at) for post in posts), default=_utc(None))
+    ET.SubElement(root, f"{{{ATOM_NS}}}updated").text = _iso(updated)
+
+    for post in posts:
+        link = f"{base_url}/learn-more#post-{post.id}"
+        entry = ET.SubElement(root, f"{{{ATOM_NS}}}entry")
+        ET.SubElement(entry, f"{{{ATOM_NS}}}title").text = post.title
+        ET.SubElement(entry, f"{{{ATOM_NS}}}id").text = link
+        ET.SubElement(entry, f"{{{ATOM_NS}}}link", href=link)
+        ET.SubElement(entry, f"{{{ATOM_NS}}}published").text = _iso(_utc(post.created_at))
+        ET.SubElement(entry, f"{{{ATOM_NS}}}updated").text = _iso(_utc(post.updated_at))
+        ET.SubElement(entry, f"{{{ATOM_NS}}}summary").text = post.excerpt
+        ET.SubElement(entry, f"{{{ATOM_NS}}}content", type="html").text = post.description_html
+        if post.content_type in {"image", "video"} and post.content_url:
+            media_url = post.content_url if "://" in post.content_url else f"{base_url}{post.content_url}"
+            ET.SubElement(entry, f"{{{ATOM_NS}}}link", rel="enclosure", href=media_url)
+    return _serialize(root)
+
+
+def _store(db: Session, name: str, content_type: str, body: bytes, last_modified: datetime) -> None:
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    name = document_name(name)
+    document = db.get(GeneratedDocument, name) or GeneratedDocument(name=name)
+    if document.etag == etag:
+        return
+    document.content_type = content_type
+    document.body = body
+    document.etag = etag
+    document.last_modified = last_modified.replace(tzinfo=None)
+    db.add(document)
+
+
+def regenerate_documents(db: Session) -> bool:
+    """
+    Rebuilds the current site's sitemap and feed; call after any post, the Learn more
+    content or the UI copy changes. Returns False when the site has no configured URL.
+    """
+    base_url = site_base_url()
+    if base_url is None:
+        return False
+    posts = db.query(Post).filter(Post.is_published == True).order_by(Post.created_at.desc()).all()
+    content = db.query(LearnMoreContent).first()
+    ui = get_ui_copy(db)
+    now = _utc(None)
+    title = ui.get("brand_title", settings.app_name)
+    subtitle = content.title if content else ""
+
+    sitemap = build_sitemap(posts, base_url)
+    feed = build_feed(posts, base_url, title, subtitle)
+    # On a cold cache concurrent requests all insert the same names; the losers
+    # roll back and store again, which now updates the winner's rows.
+    for attempt in range(2):
+        _store(db, SITEMAP, "application/xml", sitemap, now)
+        _store(db, FEED, "application/atom+xml", feed, now)
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+
+
+def _load(db: Session, name: str) -> Optional[tuple[bytes, str, datetime, str]]:
+    version = content_version(GeneratedDocument.__tablename__)
+    name = document_name(name)
+    cached = _cached.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+    document = db.get(GeneratedDocument, name)
+    if not document:
+        return None
+    snapshot = (document.body, document.etag, _utc(document.last_modified), document.content_type)
+    _cached[name] = (version, snapshot)
+    return snapshot
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def document_response(request: Request, db: Session, name: str) -> Response:
+    snapshot = _load(db, name)
+    if snapshot is None:
+        if not regenerate_documents(db):
+            return Response(status_code=404, headers={"Cache-Control": "no-store"})
+        snapshot = _load(db, name)
+    body, etag, last_modified, content_type = snapshot
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=content_type, headers=headers)
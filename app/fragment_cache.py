@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.database import replica_engine
+from app.invalidation import content_version, snapshot_versions, subscribe
+from app.tenancy import current_site
+
+MAX_FRAGMENTS = 512
+
+_fragments: "OrderedDict[tuple, Any]" = OrderedDict()
+_lock = threading.Lock()
+# Versions as of the start of the current request, and every table a fragment key has used.
+_pinned: ContextVar[Optional[dict[str, int]]] = ContextVar("pinned_versions", default=None)
+_keyed_tables: set[str] = set()
+
+
+def fragment_version(*tables: str) -> int:
+    """
+    `content_version(...)` for fragment keys, as it was when the request started. The
+    route reads its data after that, so a fragment is never stored under a version
+    newer than the data it was rendered from.
+    """
+    _keyed_tables.update(tables)
+    return content_version(*tables, versions=_pinned.get())
+
+
+def clear_fragments(site: Optional[str] = None) -> None:
+    """Drops the fragments of one site, or of every site."""
+    with _lock:
+        if site is None:
+            _fragments.clear()
+            return
+        for key in [key for key in _fragments if key[0] == site]:
+            del _fragments[key]
+
+
+def _on_invalidation(topic: str, _version: int) -> None:
+    # Per-site topics look like `<site>/<table>`; anything else is shared by all sites.
+    site, separator, table = topic.partition("/")
+    if not separator:
+        site, table = None, topic
+    # Keys already carry the version, so this only frees memory early. Tables no key
+    # reads (contact messages, page views, ...) leave the fragments alone.
+    if table not in _keyed_tables:
+        return
+    clear_fragments(site)
+    if replica_engine is not None:
+        # Fragments render from route data that may come from a lagging replica;
+        # clear once more after the lag window so such a render does not outlive it.
+        timer = threading.Timer(settings.replica_sticky_seconds, clear_fragments, args=(site,))
+        timer.daemon = True
+        timer.start()
+
+
+subscribe(_on_invalidation)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    `{% cache "name", key, ... %}...{% endcache %}` renders the body once per distinct
+    key tuple per site. Include `fragment_version(...)` of every table the body reads in
+    the key.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts: list, caller: Callable[[], Any]) -> Any:
+        key = (current_site(), *key_parts)
+        with _lock:
+            fragment = _fragments.get(key)
+            if fragment is not None:
+                _fragments.move_to_end(key)
+                return fragment
+
+        fragment = caller()
+        with _lock:
+            _fragments[key] = fragment
+            while len(_fragments) > MAX_FRAGMENTS:
+                _fragments.popitem(last=False)
+        return fragment
+
+
+class PinVersionsMiddleware:
+    """Snapshots the content versions when a request starts, for `fragment_version`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _pinned.set(snapshot_versions())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _pinned.reset(token)
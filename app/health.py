@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any, Callable
+
+from jinja2 import Environment
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.database import SessionLocal, engine, replica_engine
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_TEMPLATES = ("index.html", "about.html", "learn_more.html")
+
+_started_at = time.time()
+# Public through /readyz: failures are listed by step name only, details go to the log.
+_warm_up: dict[str, Any] = {"status": "pending", "steps": {}, "failed": []}
+
+
+def warm_templates(env: Environment) -> None:
+    from app.critical import extract_critical_css
+
+    for name in env.list_templates():
+        env.get_template(name)
+    for name in PUBLIC_TEMPLATES:
+        extract_critical_css(name)
+
+
+def _warm_pool(target: Engine) -> None:
+    # Hold several connections at once so the pool really opens that many.
+    connections = [target.connect() for _ in range(settings.warm_pool_connections)]
+    try:
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def _warm_database() -> None:
+    _warm_pool(engine)
+    if replica_engine is not None:
+        _warm_pool(replica_engine)
+
+
+def _warm_storage() -> None:
+    from app.storage import _firebase_bucket
+
+    _firebase_bucket()
+
+
+def _warm_passwords() -> None:
+    from app.auth import password_context
+
+    # Imports passlib and loads the hash backend, as the first login would.
+    password_context().dummy_verify()
+
+
+def _warm_content() -> None:
+    from app.ui_copy import get_ui_copy
+
+    db = SessionLocal()
+    try:
+        get_ui_copy(db)
+    finally:
+        db.close()
+
+
+def warm_up(env: Environment) -> None:
+    """
+    Pays the first-request costs of this worker up front: pooled connections, compiled
+    templates, the storage client, the password hasher and the UI copy cache. Only a
+    database failure keeps the worker unready; other failures are reported.
+    """
+    steps: list[tuple[str, Callable[[], None]]] = [
+        ("database", _warm_database),
+        ("templates", lambda: warm_templates(env)),
+        ("storage", _warm_storage),
+        ("passwords", _warm_passwords),
+        ("content", _warm_content),
+    ]
+    _warm_up.update(status="warming", steps={}, failed=[])
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+            _warm_up["failed"].append(name)
+        _warm_up["steps"][name] = _elapsed_ms(step_started)
+    _warm_up["total_ms"] = _elapsed_ms(started)
+    _warm_up["status"] = "failed" if "database" in _warm_up["failed"] else "ready"
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _ping(name: str, target: Engine) -> dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        with target.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception:
+        logger.exception("Readiness check %s failed", name)
+        return {"ok": False, "latency_ms": _elapsed_ms(started)}
+    return {"ok": True, "latency_ms": _elapsed_ms(started)}
+
+
+def liveness() -> dict[str, Any]:
+    return {"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.time() - _started_at)}
+
+
+def readiness() -> tuple[bool, dict[str, Any]]:
+    checks: dict[str, dict] = {"database": _ping("database", engine)}
+    if replica_engine is not None:
+        checks["replica"] = _ping("replica", replica_engine)
+    ready = _warm_up["status"] == "ready" and all(check["ok"] for check in checks.values())
+    return ready, {"ready": ready, "pid": os.getpid(), "warm_up": _warm_up, "checks": checks}
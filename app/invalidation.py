@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import logging
+import select
+import threading
+from itertools import chain
+from typing import Callable, Iterable, Mapping, Optional
+
+from sqlalchemy import event, select as sql_select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import CACHED_TABLES, TENANT_TABLES, ContentVersion
+from app.tenancy import current_site, known_sites
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "content_invalidation"
+
+Subscriber = Callable[[str, int], None]
+
+_versions: dict[str, int] = {}
+_subscribers: list[Subscriber] = []
+_lock = threading.Lock()
+_listener: "InvalidationListener | None" = None
+
+
+def site_topic(topic: str, site: Optional[str] = None) -> str:
+    """Tables holding per-site rows are versioned per site, as `<site>/<table>`."""
+    if topic in TENANT_TABLES:
+        return f"{site or current_site()}/{topic}"
+    return topic
+
+
+def content_version(*topics: str, versions: Optional[Mapping[str, int]] = None) -> int:
+    """
+    Sum of the known versions for `topics` on the current site; changes whenever any of
+    them is bumped. `versions` reads from an earlier `snapshot_versions()` instead.
+    """
+    versions = _versions if versions is None else versions
+    return sum(versions.get(site_topic(topic), 0) for topic in topics)
+
+
+def snapshot_versions() -> dict[str, int]:
+    return dict(_versions)
+
+
+def subscribe(callback: Subscriber) -> None:
+    _subscribers.append(callback)
+
+
+def _apply(topic: str, version: int) -> None:
+    with _lock:
+        if version <= _versions.get(topic, 0):
+            return
+        _versions[topic] = version
+    for callback in list(_subscribers):
+        try:
+            callback(topic, version)
+        except Exception:  # pragma: no cover - subscriber bug must not stop the bus
+            logger.exception("Invalidation subscriber failed for %s", topic)
+
+
+def _bump(session: Session, topics: Iterable[str]) -> dict[str, int]:
+    published: dict[str, int] = {}
+    is_postgres = session.get_bind().dialect.name == "postgresql"
+    for topic in sorted(topics):
+        session.execute(
+            update(ContentVersion).where(ContentVersion.topic == topic).values(version=ContentVersion.version + 1)
+        )
+        version = session.execute(
+            sql_select(ContentVersion.version).where(ContentVersion.topic == topic)
+        ).scalar_one_or_none()
+        if version is None:
+            session.add(ContentVersion(topic=topic, version=1))
+            session.flush()
+            version = 1
+        published[topic] = version
+        if is_postgres:
+            # Delivered by Postgres only when this transaction commits.
+            session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": NOTIFY_CHANNEL, "payload": f"{topic}:{version}"},
+            )
+    return published
+
+
+def publish(*topics: str) -> None:
+    """Bumps `topics` of the current site outside of an ORM write, e.g. after a Core bulk insert."""
+    db = SessionLocal()
+    try:
+        db.info["invalidate_topics"] = {site_topic(topic) for topic in topics}
+        db.commit()
+    finally:
+        db.close()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_topics(session: Session, _flush_context) -> None:
+    # Sessions created with info={"invalidate": False} write rows no cache reads.
+    if not session.info.get("invalidate", True):
+        return
+    topics = session.info.setdefault("invalidate_topics", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table_name = getattr(obj, "__tablename__", None)
+        if table_name in CACHED_TABLES:
+            topics.add(site_topic(table_name, getattr(obj, "site_key", None)))
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _publish_topics(session: Session) -> None:
+    session.flush()
+    topics = session.info.pop("invalidate_topics", None)
+    if topics:
+        session.info["published_versions"] = _bump(session, topics)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_published(session: Session) -> None:
+    for topic, version in session.info.pop("published_versions", {}).items():
+        _apply(topic, version)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_topics(session: Session) -> None:
+    session.info.pop("invalidate_topics", None)
+    session.info.pop("published_versions", None)
+
+
+def ensure_topics(engine: Engine) -> None:
+    topics = {site_topic(table, site) for table in CACHED_TABLES for site in known_sites()}
+    with engine.connect() as conn:
+        existing = set(conn.execute(sql_select(ContentVersion.topic)).scalars())
+    for topic in sorted(topics - existing):
+        try:
+            with engine.begin() as conn:
+                conn.execute(ContentVersion.__table__.insert().values(topic=topic, version=0))
+        except IntegrityError:
+            # Another worker created it first.
+            continue
+
+
+def refresh_versions(engine: Engine) -> None:
+    with engine.connect() as conn:
+        rows = conn.execute(sql_select(ContentVersion.topic, ContentVersion.version)).all()
+    for topic, version in rows:
+        _apply(topic, version)
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Keeps this worker's versions in step with the other workers. Postgres pushes
+    changes through LISTEN/NOTIFY; other databases poll the content_versions row set.
+    Either way a change is seen within `invalidation_poll_interval` seconds.
+    """
+
+    def __init__(self, engine: Engine) -> None:
+        super().__init__(name="invalidation-listener", daemon=True)
+        self.engine = engine
+        self.interval = settings.invalidation_poll_interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                if self.engine.dialect.name == "postgresql":
+                    self._listen()
+                else:
+                    refresh_versions(self.engine)
+                    self.stopped.wait(self.interval)
+            except Exception:
+                logger.exception("Invalidation listener failed; retrying")
+                self.stopped.wait(self.interval)
+
+    def _listen(self) -> None:
+        pooled = self.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.driver_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Catch anything published while we were not listening.
+            refresh_versions(self.engine)
+            while not self.stopped.is_set():
+                if select.select([connection], [], [], self.interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    topic, _, version = notification.payload.rpartition(":")
+                    if topic and version.isdigit():
+                        _apply(topic, int(version))
+        finally:
+            connection.close()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+def start_listener(engine: Engine) -> None:
+    global _listener
+    ensure_topics(engine)
+    refresh_versions(engine)
+    if _listener is None:
+        _listener = InvalidationListener(engine)
+        _listener.start()
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,23 +1,46 @@
 ﻿from __future__ import annotations
 
+import uuid
 from pathlib import Path
 from typing import Optional
 
+import anyio
 from fastapi import Depends, FastAPI, File, Form, Request, UploadFile
-from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
 from sqlalchemy.orm import Session
 
-from app.auth import get_admin_from_session, hash_password, verify_password
+from app.admission import AdmissionControlMiddleware, admission_stats
+from app.api import router as api_router
+from app.auth import get_admin_from_session, hash_password, site_admins, verify_password
 from app.config import settings
-from app.database import Base, SessionLocal, engine, get_db
+from app.counters import (
+    MAX_POSTS_PER_BEACON,
+    page_view_counts,
+    record_page_view,
+    record_post_views,
+    start_flusher,
+    stop_flusher,
+)
+from app.critical import MAIN_CSS_URL, MAIN_JS_URL, PreloadLinkMiddleware, critical_css, self_hosted_fonts
+from app.database import Base, ReadYourWritesMiddleware, engine, get_db, get_read_db
+from app.derived import (
+    refresh_about_content,
+    refresh_post,
+    refresh_service,
+    refresh_site_settings,
+)
 from app.emailer import send_contact_email
+from app.feeds import FEED, PUBLIC_PAGES, SITEMAP, document_response, regenerate_documents
+from app.fragment_cache import FragmentCacheExtension, PinVersionsMiddleware, fragment_version
+from app.health import liveness, readiness, warm_up
+from app.invalidation import start_listener, stop_listener
+from app.media import StaticAssets, media_response, resolve_media_path
 from app.models import (
     AboutContent,
     Admin,
     ContactMessage,
+    GeneratedDocument,
     IndexContent,
     LearnMoreContent,
     Post,
@@ -25,29 +48,90 @@ from app.models import (
     SiteSettings,
     TeamMember,
 )
-from app.seed import seed_initial_data
-from app.storage import save_upload
+from app.profiler import RouteProfilerMiddleware, current_sampler, is_profile, list_profiles, start_sampling
+from app.read_models import popular_posts, published_posts, service_cards, team_cards
+from app.retention import retention_stats
+from app.schema import upgrade_schema
+from app.sessions import AdminSessionMiddleware, PublicCacheMiddleware
+from app.storage import (
+    PARTIAL_SUFFIX,
+    create_upload_url,
+    finalize_direct_upload,
+    local_upload_path,
+    save_upload,
+    verify_local_upload_token,
+)
+from app.streaming import stream_template
+from app.tenancy import (
+    TenantMiddleware,
+    backfill_site_keys,
+    current_site,
+    load_hosts,
+    owns_media,
+    seed_sites,
+    watch_hosts,
+)
+from app.tracing import TracingMiddleware, instrument, start_tracing, stop_tracing
 from app.ui_copy import get_ui_copy, save_ui_copy
-from app.utils import maps_embed_url, whatsapp_link, youtube_embed_url
 
 BASE_DIR = Path(__file__).resolve().parent
+POPULAR_POSTS = 3
 
 app = FastAPI(title=settings.app_name)
-app.add_middleware(SessionMiddleware, secret_key=settings.secret_key)
-
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+app.add_middleware(AdminSessionMiddleware)
+app.add_middleware(PreloadLinkMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(RouteProfilerMiddleware)
+app.add_middleware(PublicCacheMiddleware)
+app.add_middleware(PinVersionsMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(TenantMiddleware)
+
+app.mount("/static", StaticAssets(directory=BASE_DIR / "static"), name="static")
+app.include_router(api_router)
 
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+templates.env.add_extension(FragmentCacheExtension)
+templates.env.globals["fragment_version"] = fragment_version
+templates.env.globals["critical_css"] = critical_css
+templates.env.globals["self_hosted_fonts"] = self_hosted_fonts
+templates.env.globals["main_css_url"] = MAIN_CSS_URL
+templates.env.globals["main_js_url"] = MAIN_JS_URL
+instrument(templates.env)
+
+
+_database_prepared = False
+
+
+def prepare_database() -> None:
+    global _database_prepared
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    backfill_site_keys(engine)
+    load_hosts(engine)
+    seed_sites()
+    _database_prepared = True
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
-    try:
-        seed_initial_data(db)
-    finally:
-        db.close()
+    # Workers forked by app.server inherit a prepared database from the master.
+    if not _database_prepared:
+        prepare_database()
+    watch_hosts(engine)
+    start_listener(engine)
+    start_flusher()
+    start_tracing()
+    # Runs before the worker accepts connections, so no request lands on a cold worker.
+    warm_up(templates.env)
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    stop_flusher()
+    stop_listener()
+    stop_tracing()
 
 
 def _require_admin(request: Request, db: Session) -> Optional[Admin]:
@@ -56,10 +140,10 @@ def _require_admin(request: Request, db: Session) -> Optional[Admin]:
 
 
 @app.get("/")
-def index(request: Request, db: Session = Depends(get_db)):
+def index(request: Request, db: Session = Depends(get_read_db)):
     settings_row = db.query(SiteSettings).first()
     content = db.query(IndexContent).first()
-    services = db.query(Service).order_by(Service.id).all()
+    services = service_cards(db)
     contact_status = request.query_params.get("contact")
     ui = get_ui_copy(db)
 
@@ -70,7 +154,6 @@ def index(request: Request, db: Session = Depends(get_db)):
             "settings": settings_row,
             "content": content,
             "services": services,
-            "whatsapp_link": whatsapp_link(settings_row.whatsapp_number if settings_row else ""),
             "contact_status": contact_status,
             "ui": ui,
         },
@@ -78,10 +161,10 @@ def index(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/about")
-def about(request: Request, db: Session = Depends(get_db)):
+def about(request: Request, db: Session = Depends(get_read_db)):
     content = db.query(AboutContent).first()
     settings_row = db.query(SiteSettings).first()
-    team = db.query(TeamMember).order_by(TeamMember.id).all()
+    team = team_cards(db)
     ui = get_ui_copy(db)
 
     return templates.TemplateResponse(
@@ -91,31 +174,76 @@ def about(request: Request, db: Session = Depends(get_db)):
             "content": content,
             "settings": settings_row,
             "team": team,
-            "map_url": maps_embed_url(content.location_map_url if content else ""),
             "ui": ui,
         },
     )
 
 
 @app.get("/learn-more")
-def learn_more(request: Request, db: Session = Depends(get_db)):
+def learn_more(request: Request, db: Session = Depends(get_read_db)):
     content = db.query(LearnMoreContent).first()
     settings_row = db.query(SiteSettings).first()
-    posts = db.query(Post).filter(Post.is_published == True).order_by(Post.created_at.desc()).all()
+    posts = published_posts(db)
+    popular = popular_posts(db, POPULAR_POSTS) if len(posts) > POPULAR_POSTS else []
     ui = get_ui_copy(db)
 
-    return templates.TemplateResponse(
+    return stream_template(
+        templates,
         "learn_more.html",
         {
             "request": request,
             "content": content,
             "settings": settings_row,
             "posts": posts,
+            "popular": popular,
             "ui": ui,
         },
     )
 
 
+@app.post("/views")
+async def views(request: Request):
+    # Sent by main.js with navigator.sendBeacon; counted in memory and flushed in batches.
+    form = await request.form()
+    page = form.get("page")
+    if page in PUBLIC_PAGES:
+        record_page_view(page)
+    post_ids = {int(value) for value in str(form.get("posts", "")).split(",") if value.isdigit()}
+    if post_ids:
+        # May query the site's post ids when they changed; keep that off the event loop.
+        await anyio.to_thread.run_sync(record_post_views, sorted(post_ids)[:MAX_POSTS_PER_BEACON])
+    return Response(status_code=204, headers={"Cache-Control": "no-store"})
+
+
+@app.get("/healthz")
+def healthz():
+    return JSONResponse(liveness(), headers={"Cache-Control": "no-store"})
+
+
+@app.get("/readyz")
+def readyz():
+    ready, report = readiness()
+    return JSONResponse(report, status_code=200 if ready else 503, headers={"Cache-Control": "no-store"})
+
+
+@app.get("/sitemap.xml")
+def sitemap(request: Request, db: Session = Depends(get_db)):
+    return document_response(request, db, SITEMAP)
+
+
+@app.get("/feed.xml")
+def feed(request: Request, db: Session = Depends(get_db)):
+    return document_response(request, db, FEED)
+
+
+@app.api_route("/media/{path:path}", methods=["GET", "HEAD"])
+def media(request: Request, path: str):
+    file_path = resolve_media_path(path) if owns_media(path) else None
+    if not file_path:
+        return Response(status_code=404)
+    return media_response(request, file_path)
+
+
 @app.post("/contact")
 def contact(
     request: Request,
@@ -147,7 +275,7 @@ def admin_login_post(
     username: str = Form(...),
     password: str = Form(...),
 ):
-    admin = db.query(Admin).filter(Admin.username == username).first()
+    admin = site_admins(db).filter(Admin.username == username).first()
     if not admin or not verify_password(password, admin.hashed_password):
         return templates.TemplateResponse(
             "admin/login.html",
@@ -167,7 +295,7 @@ def admin_logout(request: Request):
 
 
 @app.get("/admin")
-def admin_dashboard(request: Request, db: Session = Depends(get_db)):
+def admin_dashboard(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
@@ -179,12 +307,71 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db)):
             "request": request,
             "admin": admin,
             "ui": ui,
+            "page_views": page_view_counts(db),
+            "popular": popular_posts(db, 5),
+            "profiles": list_profiles(db) if admin.is_super else [],
+            "sampler": current_sampler() if admin.is_super else None,
         },
     )
 
 
+@app.post("/admin/profiler/start")
+def admin_profiler_start(
+    request: Request,
+    db: Session = Depends(get_db),
+    mode: str = Form("worker"),
+    seconds: int = Form(30),
+    path: str = Form(""),
+    requests: int = Form(20),
+):
+    admin = _require_admin(request, db)
+    if not admin or not admin.is_super:
+        return RedirectResponse("/admin", status_code=303)
+
+    if mode == "route":
+        if not path.startswith("/") or requests < 1:
+            return RedirectResponse("/admin?profiler=invalid#profiler", status_code=303)
+        started = start_sampling(0, path=path, requests=requests)
+    else:
+        started = start_sampling(seconds)
+    status = "started" if started else "busy"
+    return RedirectResponse(f"/admin?profiler={status}#profiler", status_code=303)
+
+
+@app.get("/admin/profiler/{name}")
+def admin_profiler_download(request: Request, name: str, db: Session = Depends(get_db)):
+    admin = _require_admin(request, db)
+    if not admin or not admin.is_super:
+        return RedirectResponse("/admin", status_code=303)
+
+    document = db.get(GeneratedDocument, name) if is_profile(name) else None
+    if not document:
+        return Response(status_code=404)
+    return Response(
+        content=document.body,
+        media_type=document.content_type,
+        headers={"Content-Disposition": f'attachment; filename="{document.name}"'},
+    )
+
+
+@app.get("/admin/stats/admission")
+def admin_admission_stats(request: Request, db: Session = Depends(get_read_db)):
+    admin = _require_admin(request, db)
+    if not admin:
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return JSONResponse(admission_stats())
+
+
+@app.get("/admin/stats/retention")
+def admin_retention_stats(request: Request, db: Session = Depends(get_read_db)):
+    admin = _require_admin(request, db)
+    if not admin:
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return JSONResponse(retention_stats(db))
+
+
 @app.get("/admin/index")
-def admin_index(request: Request, db: Session = Depends(get_db)):
+def admin_index(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
@@ -254,6 +441,7 @@ def admin_index_update(
     settings_row.social_instagram = social_instagram
     settings_row.social_x = social_x
     settings_row.social_linkedin = social_linkedin
+    refresh_site_settings(settings_row)
     db.add(settings_row)
 
     db.commit()
@@ -272,7 +460,9 @@ def admin_service_create(
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
 
-    db.add(Service(title=title, description=description, key_points=key_points))
+    service = Service(title=title, description=description, key_points=key_points)
+    refresh_service(service)
+    db.add(service)
     db.commit()
     return RedirectResponse("/admin/index?services=1", status_code=303)
 
@@ -295,6 +485,7 @@ def admin_service_update(
         service.title = title
         service.description = description
         service.key_points = key_points
+        refresh_service(service)
         db.add(service)
         db.commit()
 
@@ -316,7 +507,7 @@ def admin_service_delete(request: Request, service_id: int, db: Session = Depend
 
 
 @app.get("/admin/about")
-def admin_about(request: Request, db: Session = Depends(get_db)):
+def admin_about(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
@@ -357,6 +548,7 @@ def admin_about_update(
     content.team_title = team_title
     content.location_title = location_title
     content.location_map_url = location_map_url
+    refresh_about_content(content)
     db.add(content)
     db.commit()
 
@@ -427,7 +619,7 @@ def admin_team_delete(request: Request, member_id: int, db: Session = Depends(ge
 
 
 @app.get("/admin/learn-more")
-def admin_learn_more(request: Request, db: Session = Depends(get_db)):
+def admin_learn_more(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
@@ -436,7 +628,8 @@ def admin_learn_more(request: Request, db: Session = Depends(get_db)):
     posts = db.query(Post).order_by(Post.created_at.desc()).all()
     ui = get_ui_copy(db)
 
-    return templates.TemplateResponse(
+    return stream_template(
+        templates,
         "admin/edit_learn_more.html",
         {
             "request": request,
@@ -464,6 +657,7 @@ def admin_learn_more_update(
     content.intro_text = intro_text
     db.add(content)
     db.commit()
+    regenerate_documents(db)
 
     return RedirectResponse("/admin/learn-more?updated=1", status_code=303)
 
@@ -478,17 +672,21 @@ def admin_post_create(
     content_url: str = Form(""),
     is_published: Optional[str] = Form(None),
     content_file: UploadFile | None = File(None),
+    uploaded_object: str = Form(""),
 ):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
 
     final_url = ""
-    if content_type in {"image", "video"} and content_file and content_file.filename:
+    direct_upload = finalize_direct_upload(uploaded_object, "posts") if content_type == "video" else None
+    if uploaded_object and content_type == "video" and not direct_upload:
+        return RedirectResponse("/admin/learn-more?error=upload", status_code=303)
+    if direct_upload:
+        final_url, _storage = direct_upload
+    elif content_type in {"image", "video"} and content_file and content_file.filename:
         final_url, _storage = save_upload(content_file, "posts")
-    elif content_type == "youtube":
-        final_url = youtube_embed_url(content_url)
-    elif content_type == "social":
+    elif content_type in {"youtube", "social"}:
         final_url = content_url
 
     post = Post(
@@ -498,8 +696,10 @@ def admin_post_create(
         content_url=final_url,
         is_published=is_published == "on",
     )
+    refresh_post(post)
     db.add(post)
     db.commit()
+    regenerate_documents(db)
     return RedirectResponse("/admin/learn-more?posts=1", status_code=303)
 
 
@@ -514,6 +714,7 @@ def admin_post_update(
     content_url: str = Form(""),
     is_published: Optional[str] = Form(None),
     content_file: UploadFile | None = File(None),
+    uploaded_object: str = Form(""),
 ):
     admin = _require_admin(request, db)
     if not admin:
@@ -521,26 +722,80 @@ def admin_post_update(
 
     post = db.query(Post).filter(Post.id == post_id).first()
     if post:
+        direct_upload = finalize_direct_upload(uploaded_object, "posts") if content_type == "video" else None
+        if uploaded_object and content_type == "video" and not direct_upload:
+            return RedirectResponse("/admin/learn-more?error=upload", status_code=303)
+
         post.title = title
         post.description = description
         post.content_type = content_type
         post.is_published = is_published == "on"
 
-        if content_type in {"image", "video"} and content_file and content_file.filename:
+        if direct_upload:
+            post.content_url, _storage = direct_upload
+        elif content_type in {"image", "video"} and content_file and content_file.filename:
             post.content_url, _storage = save_upload(content_file, "posts")
-        elif content_type == "youtube":
-            post.content_url = youtube_embed_url(content_url)
-        elif content_type == "social":
+        elif content_type in {"youtube", "social"}:
             post.content_url = content_url
         elif content_type == "none":
             post.content_url = ""
 
+        refresh_post(post)
         db.add(post)
         db.commit()
+        regenerate_documents(db)
 
     return RedirectResponse("/admin/learn-more?posts=1", status_code=303)
 
 
+@app.post("/admin/uploads/sign")
+def admin_upload_sign(
+    request: Request,
+    db: Session = Depends(get_db),
+    filename: str = Form(...),
+    content_type: str = Form(...),
+):
+    admin = _require_admin(request, db)
+    if not admin:
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    if not content_type.startswith("video/"):
+        return JSONResponse({"error": "unsupported_type"}, status_code=400)
+
+    return JSONResponse(create_upload_url(filename, content_type, "posts"))
+
+
+@app.put("/admin/uploads/local/{token}")
+async def admin_upload_local(request: Request, token: str):
+    payload = verify_local_upload_token(token)
+    if not payload:
+        return Response(status_code=403)
+    if request.headers.get("content-type") != payload["content_type"]:
+        return Response(status_code=403)
+
+    max_bytes = payload.get("max_bytes", settings.upload_max_bytes)
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        return Response(status_code=413)
+
+    dest = local_upload_path(payload["path"])
+    # Unique per request, so two PUTs with the same token never share a file.
+    partial = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}{PARTIAL_SUFFIX}")
+    received = 0
+    try:
+        async with await anyio.open_file(partial, "wb") as buffer:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_bytes:
+                    break
+                await buffer.write(chunk)
+        if received > max_bytes:
+            return Response(status_code=413)
+        await anyio.to_thread.run_sync(partial.replace, dest)
+    finally:
+        await anyio.to_thread.run_sync(partial.unlink, True)
+    return Response(status_code=200)
+
+
 @app.post("/admin/posts/{post_id}/delete")
 def admin_post_delete(request: Request, post_id: int, db: Session = Depends(get_db)):
     admin = _require_admin(request, db)
@@ -551,17 +806,18 @@ def admin_post_delete(request: Request, post_id: int, db: Session = Depends(get_
     if post:
         db.delete(post)
         db.commit()
+        regenerate_documents(db)
 
     return RedirectResponse("/admin/learn-more?posts=1", status_code=303)
 
 
 @app.get("/admin/admins")
-def admin_manage_admins(request: Request, db: Session = Depends(get_db)):
+def admin_manage_admins(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
 
-    admins = db.query(Admin).order_by(Admin.id).all()
+    admins = site_admins(db).order_by(Admin.id).all()
     ui = get_ui_copy(db)
     return templates.TemplateResponse(
         "admin/manage_admins.html",
@@ -570,7 +826,7 @@ def admin_manage_admins(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/admin/site-copy")
-def admin_site_copy(request: Request, db: Session = Depends(get_db)):
+def admin_site_copy(request: Request, db: Session = Depends(get_read_db)):
     admin = _require_admin(request, db)
     if not admin:
         return RedirectResponse("/admin/login", status_code=303)
@@ -589,6 +845,8 @@ async def admin_site_copy_update(request: Request, db: Session = Depends(get_db)
     form = await request.form()
     payload = {key: str(value) for key, value in form.items()}
     save_ui_copy(db, payload)
+    # The feed title comes from the UI copy.
+    regenerate_documents(db)
     return RedirectResponse("/admin/site-copy?updated=1", status_code=303)
 
 
@@ -603,10 +861,16 @@ def admin_create_admin(
     if not admin or not admin.is_super:
         return RedirectResponse("/admin", status_code=303)
 
-    if db.query(Admin).filter(Admin.username == username).first():
+    # Unique per site, and against the operators who can also sign in here.
+    if site_admins(db).filter(Admin.username == username).first():
         return RedirectResponse("/admin/admins?error=exists", status_code=303)
 
-    new_admin = Admin(username=username, hashed_password=hash_password(password), is_super=False)
+    new_admin = Admin(
+        username=username,
+        hashed_password=hash_password(password),
+        is_super=False,
+        site_key=current_site(),
+    )
     db.add(new_admin)
     db.commit()
     return RedirectResponse("/admin/admins?created=1", status_code=303)
@@ -623,7 +887,7 @@ def admin_update_admin(
     if not admin or not admin.is_super:
         return RedirectResponse("/admin", status_code=303)
 
-    target = db.query(Admin).filter(Admin.id == admin_id).first()
+    target = site_admins(db).filter(Admin.id == admin_id).first()
     if target:
         target.hashed_password = hash_password(password)
         db.add(target)
@@ -638,7 +902,7 @@ def admin_delete_admin(request: Request, admin_id: int, db: Session = Depends(ge
     if not admin or not admin.is_super:
         return RedirectResponse("/admin", status_code=303)
 
-    target = db.query(Admin).filter(Admin.id == admin_id).first()
+    target = site_admins(db).filter(Admin.id == admin_id).first()
     if target and not target.is_super:
         db.delete(target)
         db.commit()
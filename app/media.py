@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+import anyio
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import RedirectResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.storage import PARTIAL_SUFFIX, UPLOADS_DIR
+
+# Files are read with pread in chunks of this size, one threadpool hop per chunk.
+# Uvicorn has no zero-copy send, so heavy video traffic belongs on Firebase or a CDN.
+CHUNK_SIZE = 256 * 1024
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def resolve_media_path(path: str) -> Optional[Path]:
+    # Direct uploads are written to `<name>.part` and renamed once complete.
+    if path.endswith(PARTIAL_SUFFIX):
+        return None
+    root = UPLOADS_DIR.resolve()
+    candidate = (root / path).resolve()
+    if not candidate.is_relative_to(root) or not candidate.is_file():
+        return None
+    return candidate
+
+
+class StaticAssets(StaticFiles):
+    """
+    `/static` without `uploads/`. Old `/static/uploads/...` URLs redirect to `/media/...`,
+    which checks that the file belongs to the requesting site.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        top, _, rest = path.partition(os.sep)
+        if top == UPLOADS_DIR.name:
+            if not rest:
+                raise HTTPException(status_code=404)
+            return RedirectResponse(f"/media/{quote(rest.replace(os.sep, '/'))}", status_code=301)
+        return await super().get_response(path, scope)
+
+
+def media_etag(path: Path, size: int) -> str:
+    # Stored names are random and never reused, so the name (plus size, to catch a
+    # half-written replacement) is a strong validator without hashing the content.
+    digest = hashlib.sha1(f"{path.name}:{size}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Returns an inclusive (start, end) pair for a single `bytes=` range, or None when the
+    header should be ignored. Raises ValueError when the range is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            suffix = int(end_text)
+            start, end = max(size - suffix, 0), size - 1 if suffix > 0 else -1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(value: str, etag: str, mtime: float) -> bool:
+    if value.startswith('"'):
+        return value == etag
+    # A date only matches when it is exactly the Last-Modified we send (whole seconds).
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    # If-Modified-Since only counts when there is no If-None-Match (RFC 9110 13.1.3).
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class MediaFileResponse(Response):
+    def __init__(self, path: Path, start: int, length: int, status_code: int, headers: dict) -> None:
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            offset = self.start
+            remaining = self.length
+            while remaining:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+
+def media_response(request: Request, path: Path) -> Response:
+    stat = path.stat()
+    size = stat.st_size
+    etag = media_etag(path, size)
+    headers = {
+        "accept-ranges": "bytes",
+        "cache-control": CACHE_CONTROL,
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "content-type": mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        headers.pop("content-type")
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or _if_range_matches(if_range.strip(), etag, stat.st_mtime)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}", "accept-ranges": "bytes"})
+        if byte_range:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            return MediaFileResponse(path, start, end - start + 1, 206, headers)
+
+    headers["content-length"] = str(size)
+    return MediaFileResponse(path, 0, size, 200, headers)
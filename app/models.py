@@ -2,24 +2,38 @@
 
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Integer, String, Text
+from typing import Optional
+
+from sqlalchemy import JSON, Boolean, DateTime, Index, Integer, LargeBinary, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 
 from app.database import Base
+from app.tenancy import TenantScoped
 
 
 class Admin(Base):
     __tablename__ = "admins"
+    # An index rather than a constraint so upgrade_schema can add it to existing tables.
+    __table_args__ = (Index("uq_admins_site_username", "site_key", "username", unique=True),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    username: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
+    username: Mapped[str] = mapped_column(String(80), nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     is_super: Mapped[bool] = mapped_column(Boolean, default=False)
+    # NULL for operators who manage every site.
+    site_key: Mapped[Optional[str]] = mapped_column(String(40), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
-class SiteSettings(Base):
+class SiteHost(Base):
+    __tablename__ = "site_hosts"
+
+    host: Mapped[str] = mapped_column(String(255), primary_key=True)
+    site_key: Mapped[str] = mapped_column(String(40), index=True, nullable=False)
+
+
+class SiteSettings(TenantScoped, Base):
     __tablename__ = "site_settings"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -33,8 +47,10 @@ class SiteSettings(Base):
     social_x: Mapped[str] = mapped_column(String(255), default="https://x.com")
     social_linkedin: Mapped[str] = mapped_column(String(255), default="https://linkedin.com")
 
+    whatsapp_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
 
-class IndexContent(Base):
+class IndexContent(TenantScoped, Base):
     __tablename__ = "index_content"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -61,16 +77,17 @@ class IndexContent(Base):
     )
 
 
-class Service(Base):
+class Service(TenantScoped, Base):
     __tablename__ = "services"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(120), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     key_points: Mapped[str] = mapped_column(Text, default="")
+    key_points_items: Mapped[Optional[list[str]]] = mapped_column(JSON(none_as_null=True), nullable=True)
 
 
-class AboutContent(Base):
+class AboutContent(TenantScoped, Base):
     __tablename__ = "about_content"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -88,9 +105,10 @@ class AboutContent(Base):
         String(500),
         default="https://www.google.com/maps?q=Ciudad%20de%20Mexico&output=embed",
     )
+    location_embed_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
 
 
-class TeamMember(Base):
+class TeamMember(TenantScoped, Base):
     __tablename__ = "team_members"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -100,7 +118,7 @@ class TeamMember(Base):
     image_url: Mapped[str] = mapped_column(String(500), default="")
 
 
-class LearnMoreContent(Base):
+class LearnMoreContent(TenantScoped, Base):
     __tablename__ = "learn_more_content"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -114,31 +132,85 @@ class LearnMoreContent(Base):
     )
 
 
-class Post(Base):
+class Post(TenantScoped, Base):
     __tablename__ = "posts"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(150), nullable=False)
+    # Markdown source; description_html and excerpt are compiled from it on save.
     description: Mapped[str] = mapped_column(Text, nullable=False)
+    description_html: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    excerpt: Mapped[Optional[str]] = mapped_column(String(300), nullable=True)
     content_type: Mapped[str] = mapped_column(String(30), default="none")
     content_url: Mapped[str] = mapped_column(String(500), default="")
+    embed_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    poster_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     is_published: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Written only by app.counters; NULL on rows from before view counting.
+    view_count: Mapped[Optional[int]] = mapped_column(Integer, default=0, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
-class ContactMessage(Base):
+class ContactMessage(TenantScoped, Base):
     __tablename__ = "contact_messages"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     email: Mapped[str] = mapped_column(String(120), nullable=False)
     message: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
+
+
+class ContactMessageArchive(TenantScoped, Base):
+    __tablename__ = "contact_message_archives"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    oldest_created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    newest_created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Gzip-compressed JSONL, one purged message per line.
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
 
+class PageView(TenantScoped, Base):
+    __tablename__ = "page_views"
+    __table_args__ = (UniqueConstraint("site_key", "path", name="uq_page_views_site_path"),)
 
-class UiCopy(Base):
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    path: Mapped[str] = mapped_column(String(200), nullable=False)
+    views: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class UiCopy(TenantScoped, Base):
     __tablename__ = "ui_copy"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     data: Mapped[str] = mapped_column(Text, default="{}")
+
+
+class ContentVersion(Base):
+    __tablename__ = "content_versions"
+
+    topic: Mapped[str] = mapped_column(String(120), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class GeneratedDocument(Base):
+    __tablename__ = "generated_documents"
+
+    name: Mapped[str] = mapped_column(String(80), primary_key=True)
+    content_type: Mapped[str] = mapped_column(String(80), nullable=False)
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    etag: Mapped[str] = mapped_column(String(80), nullable=False)
+    last_modified: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+TENANT_TABLES = frozenset(model.__tablename__ for model in TenantScoped.__subclasses__())
+# Tables read by in-memory caches (content_version or invalidation subscribers). Commits
+# touching only other tables (admins, contact messages, page views) publish nothing.
+CACHED_TABLES = frozenset(
+    model.__tablename__
+    for model in (SiteHost, SiteSettings, Service, TeamMember, Post, UiCopy, GeneratedDocument)
+)
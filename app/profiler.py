@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import defer
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import GeneratedDocument
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = "profile-"
+PROFILE_CONTENT_TYPE = "text/plain; charset=utf-8"
+# Same limit as the dashboard form; also keeps profile names within GeneratedDocument.name.
+MAX_ROUTE_REQUESTS = 1000
+# Leaf frames in these modules are threads parked waiting for work, not doing it.
+IDLE_MODULES = {"threading", "queue", "selectors", "concurrent.futures.thread"}
+IGNORED_THREADS = {"invalidation-listener"}
+
+_lock = threading.Lock()
+_sampler: Optional["Sampler"] = None
+
+
+def _frame_label(frame) -> str:
+    # Compiled Jinja templates have no module name; their filename is the template path.
+    module = frame.f_globals.get("__name__") or os.path.basename(frame.f_code.co_filename)
+    return f"{module}:{frame.f_code.co_qualname}".replace(";", ":").replace(" ", "_")
+
+
+class Sampler(threading.Thread):
+    """
+    Statistical profiler: every `profiler_interval` seconds it records the Python stack of
+    each busy thread in this worker. Nothing is traced between samples, and nothing at
+    all when no sampler is running.
+    """
+
+    def __init__(self, label: str, seconds: float, path: Optional[str] = None, requests: int = 0) -> None:
+        super().__init__(name="profiler", daemon=True)
+        self.label = label
+        self.deadline = time.monotonic() + seconds
+        self.path = path
+        self.remaining = requests
+        self.in_flight = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.busy = threading.Event()
+        self.stopped = threading.Event()
+        if path is None:
+            self.busy.set()
+
+    def run(self) -> None:
+        try:
+            while not self.stopped.is_set() and time.monotonic() < self.deadline:
+                # Route profiles only sample while a matching request is being served.
+                if self.busy.wait(0.5):
+                    self._sample()
+                    time.sleep(settings.profiler_interval)
+        finally:
+            _finish(self)
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, "thread")
+            if ident == own or name in IGNORED_THREADS:
+                continue
+            if frame.f_globals.get("__name__") in IDLE_MODULES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(re.sub(r"[-_]?\d+$", "", name).replace(" ", "_") or "thread")
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def request_started(self) -> None:
+        with _lock:
+            self.in_flight += 1
+            self.busy.set()
+
+    def request_finished(self) -> None:
+        with _lock:
+            self.in_flight -= 1
+            self.remaining -= 1
+            if self.in_flight <= 0:
+                self.busy.clear()
+            if self.remaining <= 0:
+                self.stopped.set()
+                self.busy.set()
+
+    def folded(self) -> str:
+        """Brendan Gregg's folded format, readable by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def current_sampler() -> Optional[Sampler]:
+    return _sampler
+
+
+def start_sampling(seconds: float, path: Optional[str] = None, requests: int = 0) -> bool:
+    """Starts a worker-wide (`path` None) or per-route profile; False if one is already running."""
+    global _sampler
+    # A route profile stays armed until its requests arrive, up to the same limit.
+    seconds = min(max(seconds, 1), settings.profiler_max_seconds) if not path else settings.profiler_max_seconds
+    if path:
+        requests = min(max(requests, 1), MAX_ROUTE_REQUESTS)
+        slug = re.sub(r"[^a-z0-9]+", "-", path.lower()).strip("-") or "root"
+        label = f"{slug[:24]}-x{requests}"
+    else:
+        label = f"worker-{int(seconds)}s"
+    with _lock:
+        if _sampler is not None:
+            return False
+        _sampler = Sampler(label, seconds, path=path, requests=requests)
+    _sampler.start()
+    return True
+
+
+def _finish(sampler: Sampler) -> None:
+    global _sampler
+    with _lock:
+        if _sampler is sampler:
+            _sampler = None
+    if not sampler.stacks:
+        logger.info("Profile %s finished without samples", sampler.label)
+        return
+    try:
+        save_profile(sampler)
+    except Exception:
+        logger.exception("Could not store profile %s", sampler.label)
+
+
+def save_profile(sampler: Sampler) -> str:
+    now = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+    name = f"{PROFILE_PREFIX}{now:%Y%m%d-%H%M%S}-{os.getpid()}-{sampler.label}.folded"
+    body = sampler.folded().encode("utf-8")
+    # Profiles share generated_documents with the feeds but no cache reads them.
+    db = SessionLocal(info={"invalidate": False})
+    try:
+        db.add(
+            GeneratedDocument(
+                name=name,
+                content_type=PROFILE_CONTENT_TYPE,
+                body=body,
+                etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                last_modified=now,
+            )
+        )
+        db.flush()
+        stale = list_profiles(db)[settings.profiler_keep :]
+        for document in stale:
+            db.delete(document)
+        db.commit()
+    finally:
+        db.close()
+    return name
+
+
+def is_profile(name: str) -> bool:
+    return name.startswith(PROFILE_PREFIX) and name.endswith(".folded")
+
+
+def list_profiles(db) -> list[GeneratedDocument]:
+    return (
+        db.query(GeneratedDocument)
+        .options(defer(GeneratedDocument.body))
+        .filter(GeneratedDocument.name.startswith(PROFILE_PREFIX))
+        .order_by(GeneratedDocument.last_modified.desc(), GeneratedDocument.name.desc())
+        .all()
+    )
+
+
+class RouteProfilerMiddleware:
+    """Marks requests to the profiled route so its sampler only runs while they are served."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        sampler = _sampler
+        if sampler is None or sampler.path is None or scope["type"] != "http" or scope["path"] != sampler.path:
+            await self.app(scope, receive, send)
+            return
+
+        sampler.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.request_finished()
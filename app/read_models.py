@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import Any, ClassVar, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Post, Service, TeamMember
+
+
+class ReadModel:
+    """
+    Immutable row for templates: only the columns a page renders, read with a Core
+    `select()` so nothing enters the identity map or is tracked for changes.
+    """
+
+    __slots__ = ()
+    columns: ClassVar[tuple] = ()
+
+    def __init__(self, *values: Any) -> None:
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    @classmethod
+    def select(cls):
+        return select(*cls.columns)
+
+    @classmethod
+    def load(cls, db: Session, statement) -> list:
+        return [cls(*row) for row in db.execute(statement)]
+
+
+class PostCard(ReadModel):
+    __slots__ = (
+        "id",
+        "title",
+        "description_html",
+        "excerpt",
+        "content_type",
+        "content_url",
+        "embed_url",
+        "poster_url",
+        "view_count",
+    )
+    columns = (
+        Post.id,
+        Post.title,
+        Post.description_html,
+        Post.excerpt,
+        Post.content_type,
+        Post.content_url,
+        Post.embed_url,
+        Post.poster_url,
+        Post.view_count,
+    )
+
+    id: int
+    title: str
+    description_html: Optional[str]
+    excerpt: Optional[str]
+    content_type: str
+    content_url: str
+    embed_url: Optional[str]
+    poster_url: Optional[str]
+    view_count: Optional[int]
+
+
+class ServiceCard(ReadModel):
+    __slots__ = ("title", "description", "key_points_items")
+    columns = (Service.title, Service.description, Service.key_points_items)
+
+    title: str
+    description: str
+    key_points_items: Optional[list[str]]
+
+
+class TeamCard(ReadModel):
+    __slots__ = ("name", "role", "bio", "image_url")
+    columns = (TeamMember.name, TeamMember.role, TeamMember.bio, TeamMember.image_url)
+
+    name: str
+    role: str
+    bio: str
+    image_url: str
+
+
+def published_posts(db: Session) -> list[PostCard]:
+    return PostCard.load(db, PostCard.select().where(Post.is_published == True).order_by(Post.created_at.desc()))
+
+
+def popular_posts(db: Session, limit: int) -> list[PostCard]:
+    return PostCard.load(
+        db,
+        PostCard.select()
+        .where(Post.is_published == True, Post.view_count > 0)
+        .order_by(Post.view_count.desc(), Post.id.desc())
+        .limit(limit),
+    )
+
+
+def service_cards(db: Session) -> list[ServiceCard]:
+    return ServiceCard.load(db, ServiceCard.select().order_by(Service.id))
+
+
+def team_cards(db: Session) -> list[TeamCard]:
+    return TeamCard.load(db, TeamCard.select().order_by(TeamMember.id))
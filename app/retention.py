@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.models import ContactMessage, ContactMessageArchive
+from app.schema import upgrade_schema
+from app.tenancy import use_site
+
+ARCHIVED_FIELDS = ("id", "name", "email", "message", "created_at")
+
+
+def retention_cutoff(days: int) -> datetime:
+    # created_at is stored as naive UTC.
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(days=days)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+
+def _archive_row(site: str, rows: list) -> dict:
+    lines = "".join(
+        json.dumps({name: row[name] for name in ARCHIVED_FIELDS}, ensure_ascii=False, default=_json_default) + "\n"
+        for row in rows
+    )
+    return {
+        "site_key": site,
+        "message_count": len(rows),
+        "oldest_created_at": min(row["created_at"] for row in rows),
+        "newest_created_at": max(row["created_at"] for row in rows),
+        "body": gzip.compress(lines.encode("utf-8")),
+    }
+
+
+def purge_messages(
+    days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """
+    Moves contact messages older than `days` into `contact_message_archives`, for every
+    site. Each batch of at most `batch_size` messages is archived and deleted in its own
+    short transaction, with `pause` seconds between batches, so the purge never holds
+    locks for long.
+    """
+    days = settings.contact_retention_days if days is None else days
+    batch_size = batch_size or settings.retention_batch_size
+    pause = settings.retention_pause if pause is None else pause
+    if days <= 0:
+        return {"cutoff": None, "archived": 0, "batches": 0, "seconds": 0.0}
+
+    cutoff = retention_cutoff(days)
+    messages = ContactMessage.__table__
+    archives = ContactMessageArchive.__table__
+    expired = messages.c.created_at < cutoff
+    if dry_run:
+        with engine.connect() as conn:
+            due = conn.execute(select(func.count()).select_from(messages).where(expired)).scalar_one()
+        return {"cutoff": cutoff, "archived": due, "batches": 0, "seconds": 0.0}
+
+    started = time.perf_counter()
+    archived = batches = 0
+    while True:
+        with engine.begin() as conn:
+            rows = (
+                conn.execute(
+                    select(messages)
+                    .where(expired)
+                    .order_by(messages.c.created_at, messages.c.id)
+                    .limit(batch_size)
+                )
+                .mappings()
+                .all()
+            )
+            if not rows:
+                break
+            by_site: dict[str, list] = defaultdict(list)
+            for row in rows:
+                by_site[row["site_key"]].append(row)
+            conn.execute(archives.insert(), [_archive_row(site, site_rows) for site, site_rows in by_site.items()])
+            conn.execute(messages.delete().where(messages.c.id.in_([row["id"] for row in rows])))
+        archived += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+    return {"cutoff": cutoff, "archived": archived, "batches": batches, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def retention_stats(db: Session) -> dict[str, Any]:
+    """Live and archived message counts for the current site."""
+    days = settings.contact_retention_days
+    live_count, oldest_live = db.query(func.count(ContactMessage.id), func.min(ContactMessage.created_at)).one()
+    due = (
+        db.query(func.count(ContactMessage.id)).filter(ContactMessage.created_at < retention_cutoff(days)).scalar()
+        if days > 0
+        else 0
+    )
+    batches, archived, compressed, oldest_archived, last_archived = db.query(
+        func.count(ContactMessageArchive.id),
+        func.coalesce(func.sum(ContactMessageArchive.message_count), 0),
+        func.coalesce(func.sum(func.length(ContactMessageArchive.body)), 0),
+        func.min(ContactMessageArchive.oldest_created_at),
+        func.max(ContactMessageArchive.archived_at),
+    ).one()
+    return {
+        "retention_days": days,
+        "live": {"messages": live_count, "oldest": _iso(oldest_live), "due_for_purge": due},
+        "archive": {
+            "batches": batches,
+            "messages": archived,
+            "compressed_bytes": compressed,
+            "oldest": _iso(oldest_archived),
+            "last_archived_at": _iso(last_archived),
+        },
+    }
+
+
+def export_archive(out: IO[str], db: Session) -> int:
+    """Writes the current site's archived messages as JSONL, oldest first."""
+    count = 0
+    batches = db.query(ContactMessageArchive).order_by(ContactMessageArchive.oldest_created_at, ContactMessageArchive.id)
+    for batch in batches.yield_per(20):
+        text = gzip.decompress(batch.body).decode("utf-8")
+        out.write(text)
+        count += batch.message_count
+    return count
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.retention", description="Archive and purge old contact messages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    purge_parser = commands.add_parser("purge", help="archive and delete messages past the retention period")
+    purge_parser.add_argument("--days", type=int, default=settings.contact_retention_days)
+    purge_parser.add_argument("--batch-size", type=int, default=settings.retention_batch_size)
+    purge_parser.add_argument("--pause", type=float, default=settings.retention_pause, help="seconds between batches")
+    purge_parser.add_argument("--dry-run", action="store_true", help="only count the messages that would move")
+    stats_parser = commands.add_parser("stats", help="show live and archived message counts")
+    export_parser = commands.add_parser("export", help="write archived messages as JSONL (.gz to compress, - for stdout)")
+    export_parser.add_argument("path")
+    for command_parser in (stats_parser, export_parser):
+        command_parser.add_argument("--site", default=settings.default_site_key, help="site key (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    if args.command == "purge":
+        result = purge_messages(args.days, args.batch_size, args.pause, dry_run=args.dry_run)
+        if result["cutoff"] is None:
+            print("Retention is disabled (--days 0); nothing to do.", file=sys.stderr)
+        elif args.dry_run:
+            print(f"{result['archived']} messages are older than {result['cutoff']:%Y-%m-%d}", file=sys.stderr)
+        else:
+            print(
+                f"Archived {result['archived']} messages older than {result['cutoff']:%Y-%m-%d} "
+                f"in {result['batches']} batches ({result['seconds']} s)",
+                file=sys.stderr,
+            )
+        return
+
+    with use_site(args.site):
+        db = SessionLocal()
+        try:
+            if args.command == "stats":
+                print(json.dumps(retention_stats(db), indent=2))
+                return
+            if args.path == "-":
+                count = export_archive(sys.stdout, db)
+            else:
+                opener = gzip.open if args.path.endswith(".gz") else open
+                with opener(args.path, "wt", encoding="utf-8") as out:
+                    count = export_archive(out, db)
+        finally:
+            db.close()
+    print(f"Exported {count} archived messages from site {args.site}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
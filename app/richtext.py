@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import argparse
+import html
+import re
+import sys
+from typing import Optional
+
+# Post cards title with <h3>, so "#" in a body becomes <h4>.
+HEADING_OFFSET = 3
+EXCERPT_CHARS = 200
+SAFE_SCHEMES = ("http://", "https://", "mailto:", "tel:")
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE_RE = re.compile(r"^ {0,3}([-*_])(\s*\1){2,}\s*$")
+_BULLET_RE = re.compile(r"^ {0,3}[-*+]\s+(.*)$")
+_NUMBER_RE = re.compile(r"^ {0,3}\d{1,9}[.)]\s+(.*)$")
+_QUOTE_RE = re.compile(r"^ {0,3}>\s?(.*)$")
+_FENCE_RE = re.compile(r"^ {0,3}(```|~~~)")
+_INLINE_RE = re.compile(
+    r"`(?P<code>[^`]+)`"
+    r"|\[(?P<label>[^\]]+)\]\(\s*(?P<href>(?:[^()\s]|\([^()\s]*\))+)(?:\s+\"[^\"]*\")?\s*\)"
+    r"|<(?P<auto>(?:https?://|mailto:)[^>\s]+)>"
+    r"|(?P<bare>https?://[^\s<]*[^\s<.,;:!?)\]'\"])"
+    r"|\*\*(?P<strong>.+?)\*\*|__(?P<strong2>.+?)__"
+    r"|\*(?P<em>[^\s*](?:.*?[^\s*])?)\*|(?<!\w)_(?P<em2>[^\s_](?:.*?[^\s_])?)_(?!\w)"
+)
+_BLOCK_TAG_RE = re.compile(r"</?(?:p|h\d|ul|ol|li|blockquote|pre|hr|br)\b[^>]*>")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _safe_href(href: str) -> Optional[str]:
+    href = html.unescape(href).strip()
+    if href.startswith(("/", "#")) and not href.startswith(("//", "/\\")):
+        return href
+    if href.lower().startswith(SAFE_SCHEMES):
+        return href
+    return None
+
+
+def _link(href: str, label_html: str) -> str:
+    safe = _safe_href(href)
+    if safe is None:
+        return label_html
+    external = ' target="_blank" rel="noreferrer"' if safe.lower().startswith(("http://", "https://")) else ""
+    return f'<a href="{html.escape(safe)}"{external}>{label_html}</a>'
+
+
+def _inline(text: str, links: bool = True) -> str:
+    """Inline Markdown to HTML. Everything that is not markup is escaped."""
+    out = []
+    position = 0
+    for match in _INLINE_RE.finditer(text):
+        out.append(html.escape(text[position : match.start()], quote=False))
+        position = match.end()
+        groups = match.groupdict()
+        if groups["code"] is not None:
+            out.append(f"<code>{html.escape(groups['code'], quote=False)}</code>")
+        elif groups["label"] is not None:
+            label = _inline(groups["label"], links=False)
+            out.append(_link(groups["href"], label) if links else label)
+        elif groups["auto"] is not None or groups["bare"] is not None:
+            url = html.escape(groups["auto"] or groups["bare"], quote=False)
+            out.append(_link(groups["auto"] or groups["bare"], url) if links else url)
+        elif groups["strong"] is not None or groups["strong2"] is not None:
+            out.append(f"<strong>{_inline(groups['strong'] or groups['strong2'], links)}</strong>")
+        else:
+            out.append(f"<em>{_inline(groups['em'] or groups['em2'], links)}</em>")
+    out.append(html.escape(text[position:], quote=False))
+    return "".join(out)
+
+
+def _paragraph(lines: list[str]) -> str:
+    # A line ending in two spaces or a backslash keeps its break, as in Markdown.
+    parts = []
+    for index, line in enumerate(lines):
+        hard_break = index < len(lines) - 1 and (line.endswith("  ") or line.endswith("\\"))
+        parts.append(_inline(line.rstrip().rstrip("\\").strip()) + ("<br />" if hard_break else ""))
+    return "<p>" + "\n".join(parts) + "</p>"
+
+
+def render_markdown(source: str) -> str:
+    """
+    Compiles the Markdown subset posts use (headings, paragraphs, lists, quotes, code,
+    rules, emphasis and links) to HTML. The output is safe to render unescaped: raw HTML
+    in the source is escaped, and links keep only http(s), mailto, tel and relative URLs.
+    """
+    lines = (source or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    blocks: list[str] = []
+    paragraph: list[str] = []
+    index = 0
+
+    def close_paragraph() -> None:
+        if paragraph:
+            blocks.append(_paragraph(paragraph))
+            paragraph.clear()
+
+    while index < len(lines):
+        line = lines[index]
+        if not line.strip():
+            close_paragraph()
+            index += 1
+            continue
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            close_paragraph()
+            code = []
+            index += 1
+            while index < len(lines) and not lines[index].lstrip().startswith(fence.group(1)):
+                code.append(lines[index])
+                index += 1
+            blocks.append(f"<pre><code>{html.escape(chr(10).join(code), quote=False)}</code></pre>")
+            index += 1
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            close_paragraph()
+            level = min(len(heading.group(1)) + HEADING_OFFSET, 6)
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+            index += 1
+            continue
+
+        if _RULE_RE.match(line):
+            close_paragraph()
+            blocks.append("<hr />")
+            index += 1
+            continue
+
+        if _BULLET_RE.match(line) or _NUMBER_RE.match(line):
+            close_paragraph()
+            pattern = _BULLET_RE if _BULLET_RE.match(line) else _NUMBER_RE
+            tag = "ul" if pattern is _BULLET_RE else "ol"
+            items: list[list[str]] = []
+            while index < len(lines):
+                item = pattern.match(lines[index])
+                if item:
+                    items.append([item.group(1)])
+                elif lines[index].strip() and lines[index][:1] in {" ", "\t"}:
+                    items[-1].append(lines[index].strip())
+                else:
+                    break
+                index += 1
+            rendered = "".join(f"<li>{_inline(' '.join(item))}</li>" for item in items)
+            blocks.append(f"<{tag}>{rendered}</{tag}>")
+            continue
+
+        quote = _QUOTE_RE.match(line)
+        if quote:
+            close_paragraph()
+            quoted = []
+            while index < len(lines) and _QUOTE_RE.match(lines[index]):
+                quoted.append(_QUOTE_RE.match(lines[index]).group(1))
+                index += 1
+            blocks.append(f"<blockquote>{render_markdown(chr(10).join(quoted))}</blockquote>")
+            continue
+
+        paragraph.append(line)
+        index += 1
+
+    close_paragraph()
+    return "\n".join(blocks)
+
+
+def plain_excerpt(compiled_html: str, limit: int = EXCERPT_CHARS) -> str:
+    """Plain text of compiled HTML, cut at a word boundary to at most `limit` characters."""
+    text = _TAG_RE.sub("", _BLOCK_TAG_RE.sub(" ", compiled_html))
+    text = " ".join(html.unescape(text).split())
+    if len(text) <= limit:
+        return text
+    cut = text[: limit - 1].rsplit(" ", 1)[0].rstrip(".,;:")
+    return f"{cut}…"
+
+
+def recompile_posts(site: str) -> int:
+    """Recompiles every post of `site` and drops its feed and sitemap so they are rebuilt."""
+    from app.database import SessionLocal
+    from app.derived import refresh_post
+    from app.feeds import FEED, SITEMAP, document_name
+    from app.invalidation import publish
+    from app.models import GeneratedDocument, Post
+    from app.tenancy import use_site
+
+    with use_site(site):
+        db = SessionLocal()
+        try:
+            changed = 0
+            for post in db.query(Post).order_by(Post.id):
+                refresh_post(post)
+                changed += db.is_modified(post)
+            db.query(GeneratedDocument).filter(
+                GeneratedDocument.name.in_([document_name(SITEMAP), document_name(FEED)])
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        publish(Post.__tablename__, GeneratedDocument.__tablename__)
+    return changed
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from sqlalchemy import select
+
+    from app.database import Base, engine
+    from app.models import Post
+    from app.schema import upgrade_schema
+
+    parser = argparse.ArgumentParser(prog="python -m app.richtext", description="Manage compiled post bodies.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    recompile_parser = commands.add_parser("recompile", help="recompile every post body, e.g. after a renderer change")
+    recompile_parser.add_argument("--site", help="only this site (default: every site)")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    if args.site:
+        sites = [args.site]
+    else:
+        with engine.connect() as conn:
+            sites = conn.execute(select(Post.site_key).distinct().order_by(Post.site_key)).scalars().all()
+    for site in sites:
+        changed = recompile_posts(site)
+        print(f"Site {site}: {changed} posts changed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.database import Base
+
+
+def _scope_admin_usernames(conn: Connection) -> None:
+    # Usernames used to be unique across sites; now only per site (uq_admins_site_username).
+    from app.models import Admin
+
+    inspector = inspect(conn)
+    if not inspector.has_table(Admin.__tablename__):
+        return
+    global_unique = [
+        constraint
+        for constraint in inspector.get_unique_constraints(Admin.__tablename__)
+        if constraint["column_names"] == ["username"]
+    ]
+    if not global_unique:
+        return
+    table = Admin.__table__
+    preparer = conn.dialect.identifier_preparer
+    if conn.dialect.name != "sqlite":
+        for constraint in global_unique:
+            conn.execute(
+                text(f"ALTER TABLE {preparer.format_table(table)} DROP CONSTRAINT {preparer.quote(constraint['name'])}")
+            )
+        return
+    # SQLite cannot drop a constraint: rebuild the table from the model and copy the rows.
+    for index in inspector.get_indexes(table.name):
+        conn.execute(text(f"DROP INDEX {preparer.quote(index['name'])}"))
+    conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} RENAME TO admins_old"))
+    table.create(conn)
+    columns = ", ".join(preparer.format_column(column) for column in table.columns)
+    conn.execute(text(f"INSERT INTO {preparer.format_table(table)} ({columns}) SELECT {columns} FROM admins_old"))
+    conn.execute(text("DROP TABLE admins_old"))
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Adds columns and indexes declared on the models but missing from existing tables.
+    `create_all` only creates whole tables, so new nullable columns land here.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                    )
+                )
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+        _scope_admin_usernames(conn)
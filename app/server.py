@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_CLASS = "uvicorn_worker.UvicornWorker"
+RELOAD_SETTLE_SECONDS = 5
+
+
+def available_cores() -> int:
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS
+        cores = os.cpu_count() or 1
+    quota = _read_text("/sys/fs/cgroup/cpu.max")
+    if quota and not quota.startswith("max"):
+        limit, period = quota.split()[:2]
+        cores = min(cores, max(1, int(int(limit) / int(period))))
+    return max(1, cores)
+
+
+def available_memory_mb() -> Optional[int]:
+    limit = _read_text("/sys/fs/cgroup/memory.max") or _read_text("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if limit and limit.isdigit() and int(limit) < 1 << 60:
+        return int(limit) // (1024 * 1024)
+    meminfo = _read_text("/proc/meminfo")
+    for line in (meminfo or "").splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) // 1024
+    return None
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY wins; otherwise 2 per core, capped by the per-worker memory budget."""
+    if settings.web_concurrency:
+        return settings.web_concurrency
+    workers = available_cores() * 2
+    memory_mb = available_memory_mb()
+    if memory_mb:
+        workers = min(workers, memory_mb // settings.worker_memory_mb)
+    return max(1, min(workers, settings.max_workers))
+
+
+def warm_master() -> None:
+    """Loads everything workers would otherwise build on their first request, before fork."""
+    from app.health import warm_templates
+    from app.main import prepare_database, templates
+
+    # Schema and seed once here; workers inherit the flag prepare_database sets and skip it,
+    # so workers booting together do not race on them.
+    prepare_database()
+    # Connections, the storage client and the hasher are per process; workers warm those.
+    warm_templates(templates.env)
+
+
+def _post_fork(_server, _worker) -> None:
+    from app.database import engine, replica_engine
+
+    # Connections opened in the master must not be shared with the children.
+    engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.dispose(close=False)
+
+
+class Server(BaseApplication):
+    def __init__(self) -> None:
+        self.options = {
+            "bind": f"{settings.server_host}:{settings.server_port}",
+            "workers": worker_count(),
+            "worker_class": WORKER_CLASS,
+            "preload_app": True,
+            "max_requests": settings.worker_max_requests,
+            "max_requests_jitter": settings.worker_max_requests_jitter,
+            "timeout": settings.worker_timeout,
+            "graceful_timeout": settings.graceful_timeout,
+            "pidfile": settings.server_pidfile,
+            "post_fork": _post_fork,
+            "accesslog": "-",
+        }
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def run(self) -> None:
+        arbiter = Arbiter(self)
+        # USR2 re-executes START_CTX; under `python -m` argv[0] is a file path that
+        # cannot import the `app` package, so re-exec the module form instead.
+        arbiter.START_CTX["args"] = [sys.executable, "-m", "app.server", "run"]
+        try:
+            arbiter.run()
+        except RuntimeError as exc:
+            sys.exit(f"Error: {exc}")
+
+    def load(self):
+        from app.main import app
+
+        warm_master()
+        return app
+
+
+def reload() -> None:
+    """
+    Zero-downtime code reload: USR2 starts a new master (and workers) on the new code
+    next to the old one, then the old master drains its requests and exits.
+    """
+    pidfile = Path(settings.server_pidfile)
+    old_pid = int(pidfile.read_text().strip())
+    os.kill(old_pid, signal.SIGUSR2)
+
+    # The new master writes `<pidfile>.2` and takes over the pidfile once the old one exits.
+    new_pidfile = pidfile.with_name(pidfile.name + ".2")
+    deadline = time.monotonic() + settings.worker_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        new_pid = new_pidfile.read_text().strip() if new_pidfile.exists() else ""
+        if new_pid.isdigit() and int(new_pid) != old_pid:
+            break
+    else:
+        sys.exit("New master did not start; old master left running.")
+
+    # Give the new workers time to boot before the old master stops accepting.
+    time.sleep(RELOAD_SETTLE_SECONDS)
+    os.kill(old_pid, signal.SIGTERM)
+    print(f"Reloaded: master {old_pid} -> {new_pid}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "run":
+        Server().run()
+    elif command == "reload":
+        reload()
+    elif command == "workers":
+        print(worker_count())
+    else:
+        sys.exit("usage: python -m app.server [run|reload|workers]")
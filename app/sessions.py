@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+ADMIN_PREFIX = "/admin"
+# Name of the app-wide cookie used before sessions were scoped to /admin.
+LEGACY_SESSION_COOKIE = "session"
+EXPIRED_LEGACY_COOKIE = f"{LEGACY_SESSION_COOKIE}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; httponly; samesite=lax"
+
+
+def is_admin_path(path: str) -> bool:
+    return path == ADMIN_PREFIX or path.startswith(ADMIN_PREFIX + "/")
+
+
+class AdminSessionMiddleware:
+    """
+    Session support for `/admin` only, with a cookie the browser sends nowhere else.
+    Public requests skip cookie decoding and signing entirely.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.sessions = SessionMiddleware(
+            app,
+            secret_key=settings.secret_key,
+            session_cookie=settings.admin_session_key,
+            path=ADMIN_PREFIX,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not is_admin_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        cookies = cookie_parser(dict(scope["headers"]).get(b"cookie", b"").decode("latin-1"))
+        if LEGACY_SESSION_COOKIE not in cookies:
+            await self.sessions(scope, receive, send)
+            return
+
+        async def send_expiring_legacy(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", EXPIRED_LEGACY_COOKIE)
+            await send(message)
+
+        await self.sessions(scope, receive, send_expiring_legacy)
+
+
+class PublicCacheMiddleware:
+    """
+    Public responses carry no cookies and default to `Cache-Control: public`, so a CDN
+    or shared proxy can serve anonymous traffic. Routes that set their own
+    Cache-Control keep it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.cache_control = f"public, max-age={settings.public_cache_seconds}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or is_admin_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        cacheable = scope["method"] in {"GET", "HEAD"}
+
+        async def send_public(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                del headers["set-cookie"]
+                if cacheable and message["status"] == 200 and "cache-control" not in headers:
+                    headers["cache-control"] = self.cache_control
+            await send(message)
+
+        await self.app(scope, receive, send_public)
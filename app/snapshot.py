@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sys
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
+from typing import IO, Any, ContextManager, Iterator, Optional
+
+from sqlalchemy import Date, DateTime, Integer, Table, exists, select, text
+from sqlalchemy.engine import Connection
+
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.derived import backfill_derived_fields
+from app.feeds import FEED, SITEMAP, document_name
+from app.invalidation import publish
+from app.media import resolve_media_path
+from app.models import (
+    AboutContent,
+    ContactMessage,
+    GeneratedDocument,
+    IndexContent,
+    LearnMoreContent,
+    Post,
+    Service,
+    SiteSettings,
+    TeamMember,
+    UiCopy,
+)
+from app.schema import upgrade_schema
+from app.tenancy import use_site
+
+FORMAT_VERSION = 1
+CHUNK_ROWS = 1000
+CONTENT_MODELS = (SiteSettings, IndexContent, AboutContent, LearnMoreContent, Service, TeamMember, Post, UiCopy)
+MESSAGE_MODELS = (ContactMessage,)
+MEDIA_COLUMNS = {TeamMember.__tablename__: ("image_url",), Post.__tablename__: ("content_url",)}
+LOCAL_MEDIA_PREFIXES = ("/media/", "/static/uploads/")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _tables(include_messages: bool) -> list[Table]:
+    models = CONTENT_MODELS + (MESSAGE_MODELS if include_messages else ())
+    return [model.__table__ for model in models]
+
+
+def _open(path: str, mode: str) -> ContextManager[IO[str]]:
+    if path == "-":
+        # Leaves stdout and stdin open when the caller's `with` block ends.
+        return nullcontext(sys.stdout if "w" in mode else sys.stdin)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+
+def _dump(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n"
+
+
+def _media_reference(url: str) -> Optional[dict]:
+    if not url:
+        return None
+    for prefix in LOCAL_MEDIA_PREFIXES:
+        if url.startswith(prefix):
+            path = resolve_media_path(url[len(prefix) :])
+            return {"type": "media", "url": url, "local": True, "size": path.stat().st_size if path else None}
+    if "://" in url:
+        return {"type": "media", "url": url, "local": False}
+    return None
+
+
+def export_snapshot(out: IO[str], include_messages: bool = False, site: Optional[str] = None) -> dict[str, int]:
+    """
+    Writes one JSON object per line: a header, then every row of each content table for
+    `site`, then one `media` line per distinct file the rows reference. Rows are streamed
+    from the database, so memory use does not grow with the size of the site.
+    """
+    site = site or settings.default_site_key
+    tables = _tables(include_messages)
+    counts: dict[str, int] = {}
+    media: set[str] = set()
+    out.write(
+        _dump(
+            {
+                "type": "snapshot",
+                "format": FORMAT_VERSION,
+                "created_at": datetime.now(timezone.utc).replace(microsecond=0),
+                "site": site,
+                "tables": [table.name for table in tables],
+            }
+        )
+    )
+    with engine.connect() as conn:
+        for table in tables:
+            counts[table.name] = 0
+            media_columns = MEDIA_COLUMNS.get(table.name, ())
+            result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(
+                select(table).where(table.c.site_key == site).order_by(*table.primary_key.columns)
+            )
+            for row in result.mappings():
+                out.write(_dump({"type": "row", "table": table.name, "values": dict(row)}))
+                counts[table.name] += 1
+                media.update(row[column] for column in media_columns if row[column])
+
+    for url in sorted(media):
+        reference = _media_reference(url)
+        if reference:
+            out.write(_dump(reference))
+    return counts
+
+
+def _records(source: IO[str]) -> Iterator[dict]:
+    for number, line in enumerate(source, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise SnapshotError(f"Line {number} is not valid JSON") from None
+
+
+def _row_converter(table: Table, site: str, keep_ids: bool):
+    date_columns = {column.name for column in table.columns if isinstance(column.type, (DateTime, Date))}
+    known = {column.name for column in table.columns}
+    if not keep_ids:
+        known -= {column.name for column in table.primary_key.columns}
+
+    def convert(values: dict) -> dict:
+        # Columns added after the snapshot was taken keep their defaults; removed ones are dropped.
+        row = {name: value for name, value in values.items() if name in known}
+        row["site_key"] = site
+        for name in date_columns & row.keys():
+            if isinstance(row[name], str):
+                parsed = datetime.fromisoformat(row[name])
+                row[name] = parsed.date() if isinstance(table.columns[name].type, Date) else parsed
+        return row
+
+    return convert
+
+
+def _reset_sequences(conn: Connection, tables: list[Table]) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        for column in table.primary_key.columns:
+            if not isinstance(column.type, Integer):
+                continue
+            conn.execute(
+                text(
+                    "SELECT setval(pg_get_serial_sequence(:table, :column), "
+                    f"COALESCE((SELECT MAX({column.name}) FROM {table.name}), 1), "
+                    f"(SELECT MAX({column.name}) FROM {table.name}) IS NOT NULL)"
+                ),
+                {"table": table.name, "column": column.name},
+            )
+
+
+def import_snapshot(source: IO[str], site: Optional[str] = None) -> dict[str, Any]:
+    """
+    Replaces the rows of `site` in every table listed in the snapshot header with the
+    snapshot rows, using chunked executemany inserts inside a single transaction. Reads
+    line by line and holds at most `CHUNK_ROWS` rows per table in memory. Row ids are
+    kept unless other sites already have rows in that table.
+    """
+    site = site or settings.default_site_key
+    records = _records(source)
+    header = next(records, None)
+    if not header or header.get("type") != "snapshot":
+        raise SnapshotError("Missing snapshot header")
+    if header.get("format") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {header.get('format')!r}")
+
+    metadata_tables = Base.metadata.tables
+    allowed = {table.name for table in _tables(include_messages=True)}
+    unknown = [name for name in header["tables"] if name not in allowed]
+    if unknown:
+        raise SnapshotError(f"Snapshot contains tables this site does not import: {', '.join(unknown)}")
+    tables = [metadata_tables[name] for name in header["tables"]]
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    counts = {table.name: 0 for table in tables}
+    pending: dict[str, list[dict]] = {table.name: [] for table in tables}
+    missing_media: list[str] = []
+    invalid_media: list[str] = []
+
+    def flush(conn: Connection, name: str) -> None:
+        if pending[name]:
+            conn.execute(metadata_tables[name].insert(), pending[name])
+            counts[name] += len(pending[name])
+            pending[name] = []
+
+    with use_site(site):
+        documents = [document_name(SITEMAP), document_name(FEED)]
+
+    with engine.begin() as conn:
+        converters = {}
+        for table in reversed(tables):
+            conn.execute(table.delete().where(table.c.site_key == site))
+            shared = conn.execute(select(exists().where(table.c.site_key != site))).scalar()
+            converters[table.name] = _row_converter(table, site, keep_ids=not shared)
+        # The sitemap and feed are rebuilt from the new posts on the next request.
+        conn.execute(GeneratedDocument.__table__.delete().where(GeneratedDocument.name.in_(documents)))
+
+        for record in records:
+            kind = record.get("type")
+            if kind == "row":
+                name = record.get("table")
+                if name not in pending:
+                    raise SnapshotError(f"Row for table {name!r} not listed in the header")
+                pending[name].append(converters[name](record["values"]))
+                if len(pending[name]) >= CHUNK_ROWS:
+                    flush(conn, name)
+            elif kind == "media":
+                reference = _media_reference(record.get("url") or "")
+                if reference is None:
+                    invalid_media.append(repr(record.get("url")))
+                elif reference["local"] and reference["size"] is None:
+                    missing_media.append(record["url"])
+        for table in tables:
+            flush(conn, table.name)
+        _reset_sequences(conn, tables)
+
+    with use_site(site):
+        db = SessionLocal()
+        try:
+            # Snapshots from older versions may lack the columns computed at save time.
+            backfill_derived_fields(db)
+        finally:
+            db.close()
+        publish(*(table.name for table in tables), GeneratedDocument.__tablename__)
+    return {"rows": counts, "missing_media": missing_media, "invalid_media": invalid_media}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.snapshot", description="Export or import site content.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a JSONL snapshot (.gz to compress, - for stdout)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--include-messages", action="store_true", help="also export contact messages")
+    import_parser = commands.add_parser("import", help="replace content with a snapshot")
+    import_parser.add_argument("path")
+    for command_parser in (export_parser, import_parser):
+        command_parser.add_argument("--site", default=settings.default_site_key, help="site key (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        with _open(args.path, "w") as out:
+            counts = export_snapshot(out, include_messages=args.include_messages, site=args.site)
+        print(f"Exported {sum(counts.values())} rows from site {args.site}: {counts}", file=sys.stderr)
+        return
+
+    try:
+        with _open(args.path, "r") as source:
+            result = import_snapshot(source, site=args.site)
+    except SnapshotError as exc:
+        sys.exit(f"Import failed, nothing was changed: {exc}")
+    print(f"Imported {sum(result['rows'].values())} rows into site {args.site}: {result['rows']}", file=sys.stderr)
+    if result["missing_media"]:
+        print(f"{len(result['missing_media'])} local media files are not in this environment:", file=sys.stderr)
+        for url in result["missing_media"][:20]:
+            print(f"  {url}", file=sys.stderr)
+        if len(result["missing_media"]) > 20:
+            print("  ...", file=sys.stderr)
+    if result["invalid_media"]:
+        print(f"Ignored {len(result['invalid_media'])} media lines with an unrecognized url:", file=sys.stderr)
+        for url in result["invalid_media"][:20]:
+            print(f"  {url}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,74 @@ confirmButtons.forEach((button) => {
     }
   });
 });
+
+const directUploadForms = document.querySelectorAll('form[data-direct-upload]');
+directUploadForms.forEach((form) => {
+  form.addEventListener('submit', async (event) => {
+    if (form.dataset.uploaded === 'true') {
+      return;
+    }
+    if (event.submitter && event.submitter.hasAttribute('formaction')) {
+      return;
+    }
+    const typeSelect = form.querySelector('select[name="content_type"]');
+    const fileInput = form.querySelector('input[name="content_file"]');
+    const objectInput = form.querySelector('input[name="uploaded_object"]');
+    const status = form.querySelector('[data-upload-status]');
+    const file = fileInput && fileInput.files[0];
+    if (!typeSelect || typeSelect.value !== 'video' || !file || !objectInput) {
+      return;
+    }
+
+    event.preventDefault();
+    if (status) {
+      status.hidden = false;
+      status.textContent = 'Subiendo video...';
+    }
+
+    try {
+      const signBody = new FormData();
+      signBody.append('filename', file.name);
+      signBody.append('content_type', file.type || 'video/mp4');
+      const signResponse = await fetch('/admin/uploads/sign', {
+        method: 'POST',
+        body: signBody,
+        credentials: 'same-origin',
+      });
+      if (!signResponse.ok) {
+        throw new Error('sign');
+      }
+      const target = await signResponse.json();
+      if (target.max_bytes && file.size > target.max_bytes) {
+        throw new Error('too_large');
+      }
+      const uploadResponse = await fetch(target.upload_url, {
+        method: target.method,
+        headers: target.headers,
+        body: file,
+      });
+      if (uploadResponse.status === 413) {
+        throw new Error('too_large');
+      }
+      if (!uploadResponse.ok) {
+        throw new Error('upload');
+      }
+      objectInput.value = target.object_path;
+      fileInput.value = '';
+    } catch (error) {
+      objectInput.value = '';
+      if (error.message === 'too_large') {
+        if (status) {
+          status.textContent = 'El video supera el tamaño máximo permitido.';
+        }
+        return;
+      }
+      if (status) {
+        status.textContent = 'Subida directa no disponible, enviando por el servidor...';
+      }
+    }
+
+    form.dataset.uploaded = 'true';
+    form.submit();
+  });
+});
@@ -348,3 +348,73 @@ navAnchors.forEach((link) => {
     }, 280);
   });
 });
+
+const sendViews = (fields) => {
+  const body = new URLSearchParams(fields);
+  if (navigator.sendBeacon) {
+    navigator.sendBeacon('/views', body);
+  } else {
+    fetch('/views', { method: 'POST', body, keepalive: true }).catch(() => {});
+  }
+};
+
+sendViews({ page: window.location.pathname });
+
+const viewedPosts = new Set();
+const unsentPosts = [];
+const postCards = document.querySelectorAll('[data-post-id]');
+
+if (postCards.length && 'IntersectionObserver' in window) {
+  const postObserver = new IntersectionObserver(
+    (entries) => {
+      entries.forEach((entry) => {
+        const postId = entry.target.dataset.postId;
+        if (entry.isIntersecting && !viewedPosts.has(postId)) {
+          viewedPosts.add(postId);
+          unsentPosts.push(postId);
+          postObserver.unobserve(entry.target);
+        }
+      });
+    },
+    { threshold: 0.5 }
+  );
+
+  postCards.forEach((card) => postObserver.observe(card));
+
+  const flushPostViews = () => {
+    if (unsentPosts.length) {
+      sendViews({ posts: unsentPosts.splice(0).join(',') });
+    }
+  };
+
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      flushPostViews();
+    }
+  });
+  window.addEventListener('pagehide', flushPostViews);
+}
+
+const embedFacades = document.querySelectorAll('[data-embed-src]');
+
+embedFacades.forEach((facade) => {
+  facade.addEventListener(
+    'click',
+    () => {
+      const src = new URL(facade.dataset.embedSrc, window.location.href);
+      if ('embedAutoplay' in facade.dataset) {
+        src.searchParams.set('autoplay', '1');
+      }
+
+      const iframe = document.createElement('iframe');
+      iframe.src = src.toString();
+      iframe.title = facade.dataset.embedTitle || '';
+      iframe.allow = 'accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture';
+      iframe.allowFullscreen = true;
+      iframe.referrerPolicy = 'no-referrer-when-downgrade';
+      facade.replaceWith(iframe);
+      iframe.focus();
+    },
+    { once: true }
+  );
+});
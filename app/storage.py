@@ -1,27 +1,32 @@
 ﻿from __future__ import annotations
 
+import mimetypes
 import os
+import re
 import uuid
+from datetime import timedelta
 from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 from fastapi import UploadFile
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 
 from app.config import settings
-
-try:
-    import firebase_admin
-    from firebase_admin import credentials, storage
-except Exception:  # pragma: no cover - optional dependency
-    firebase_admin = None
-    credentials = None
-    storage = None
+from app.tenancy import current_site
+from app.tracing import KIND_CLIENT, span
 
 
 @lru_cache(maxsize=1)
 def _firebase_bucket():
-    if not firebase_admin or not settings.firebase_credentials or not settings.firebase_bucket:
+    if not settings.firebase_credentials or not settings.firebase_bucket:
+        return None
+    try:
+        # Imported on first use: the Google client libraries take longer to import than
+        # the rest of the app, and workers without Firebase never need them.
+        import firebase_admin
+        from firebase_admin import credentials, storage
+    except Exception:  # pragma: no cover - optional dependency
         return None
     bucket_name = settings.firebase_bucket
     if bucket_name.startswith("gs://"):
@@ -36,31 +41,138 @@ def _firebase_bucket():
     return storage.bucket()
 
 
-def _extension_from_filename(filename: str) -> str:
-    if not filename or "." not in filename:
-        return ""
-    return "." + filename.rsplit(".", 1)[-1].lower()
+UPLOADS_DIR = Path(__file__).resolve().parent / "static" / "uploads"
+LOCAL_UPLOAD_SALT = "direct-upload"
+PARTIAL_SUFFIX = ".part"
+_EXTENSION = r"[a-z0-9]{1,8}"
+_EXTENSION_RE = re.compile(_EXTENSION)
+_OBJECT_PATH_RE = re.compile(
+    rf"^(?P<site>[a-z0-9][a-z0-9-]{{0,39}})/(?P<folder>[a-z]+)/(?P<name>[0-9a-f]{{32}}(\.{_EXTENSION})?)$"
+)
+
+
+def _extension_from_filename(filename: str, content_type: str = "") -> str:
+    # Only extensions that _OBJECT_PATH_RE accepts back; otherwise the one the content
+    # type implies (clip.quicktime -> .mov), or none.
+    extension = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if not _EXTENSION_RE.fullmatch(extension):
+        extension = (mimetypes.guess_extension(content_type) or "").lstrip(".")
+    return f".{extension}" if _EXTENSION_RE.fullmatch(extension) else ""
 
 
 def save_upload(file: UploadFile, folder: str) -> tuple[str, str]:
     """
     Returns (public_url, storage_type) where storage_type is 'firebase' or 'local'.
+    Files are stored under the current site's key.
+    """
+    ext = _extension_from_filename(file.filename or "", file.content_type or "")
+    object_path = f"{current_site()}/{folder}/{uuid.uuid4().hex}{ext}"
+
+    with span("storage.save_upload", **{"storage.folder": folder}) as upload_span:
+        bucket = _firebase_bucket()
+        if bucket:
+            blob = bucket.blob(object_path)
+            content = file.file.read()
+            upload_span.set_attribute("storage.bytes", len(content))
+            with span("firebase.upload_from_string", KIND_CLIENT):
+                blob.upload_from_string(content, content_type=file.content_type)
+            with span("firebase.make_public", KIND_CLIENT):
+                blob.make_public()
+            return blob.public_url, "firebase"
+
+        dest = local_upload_path(object_path)
+        content = file.file.read()
+        upload_span.set_attribute("storage.bytes", len(content))
+        with dest.open("wb") as buffer:
+            buffer.write(content)
+        public_url = f"/media/{object_path}"
+        return public_url, "local"
+
+
+def _upload_signer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(settings.secret_key, salt=LOCAL_UPLOAD_SALT)
+
+
+def create_upload_url(filename: str, content_type: str, folder: str) -> dict:
     """
-    ext = _extension_from_filename(file.filename or "")
-    filename = f"{uuid.uuid4().hex}{ext}"
+    Returns a short-lived signed PUT target so the browser can upload straight to storage.
+    The client must send the returned headers verbatim and then submit `object_path`.
+    """
+    ext = _extension_from_filename(filename, content_type)
+    object_path = f"{current_site()}/{folder}/{uuid.uuid4().hex}{ext}"
+    headers = {"Content-Type": content_type}
 
     bucket = _firebase_bucket()
     if bucket:
-        blob = bucket.blob(f"{folder}/{filename}")
-        content = file.file.read()
-        blob.upload_from_string(content, content_type=file.content_type)
-        blob.make_public()
+        blob = bucket.blob(object_path)
+        # Signed, so Cloud Storage itself rejects bodies over the limit.
+        size_range = {"x-goog-content-length-range": f"0,{settings.upload_max_bytes}"}
+        headers.update(size_range)
+        upload_url = blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=settings.upload_url_ttl),
+            method="PUT",
+            content_type=content_type,
+            headers=size_range,
+        )
+        storage_type = "firebase"
+    else:
+        token = _upload_signer().dumps(
+            {"path": object_path, "content_type": content_type, "max_bytes": settings.upload_max_bytes}
+        )
+        upload_url = f"/admin/uploads/local/{token}"
+        storage_type = "local"
+
+    return {
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": headers,
+        "object_path": object_path,
+        "expires_in": settings.upload_url_ttl,
+        "max_bytes": settings.upload_max_bytes,
+        "storage": storage_type,
+    }
+
+
+def verify_local_upload_token(token: str) -> Optional[dict]:
+    try:
+        payload = _upload_signer().loads(token, max_age=settings.upload_url_ttl)
+    except (BadSignature, SignatureExpired):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    match = _OBJECT_PATH_RE.match(payload.get("path", ""))
+    if not match or match.group("site") != current_site():
+        return None
+    return payload
+
+
+def local_upload_path(object_path: str) -> Path:
+    dest = UPLOADS_DIR / object_path
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    return dest
+
+
+def finalize_direct_upload(object_path: str, folder: str) -> Optional[tuple[str, str]]:
+    """
+    Returns (public_url, storage_type) for an object uploaded through `create_upload_url`,
+    or None when the path is malformed or the object was never written.
+    """
+    match = _OBJECT_PATH_RE.match(object_path or "")
+    if not match or match.group("site") != current_site() or match.group("folder") != folder:
+        return None
+
+    bucket = _firebase_bucket()
+    if bucket:
+        blob = bucket.blob(object_path)
+        with span("firebase.exists", KIND_CLIENT):
+            exists = blob.exists()
+        if not exists:
+            return None
+        with span("firebase.make_public", KIND_CLIENT):
+            blob.make_public()
         return blob.public_url, "firebase"
 
-    uploads_dir = Path(__file__).resolve().parent / "static" / "uploads" / folder
-    uploads_dir.mkdir(parents=True, exist_ok=True)
-    dest = uploads_dir / filename
-    with dest.open("wb") as buffer:
-        buffer.write(file.file.read())
-    public_url = f"/static/uploads/{folder}/{filename}"
-    return public_url, "local"
+    if not (UPLOADS_DIR / object_path).is_file():
+        return None
+    return f"/media/{object_path}", "local"
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+STREAM_CHUNK_BYTES = 16 * 1024
+HEAD_END = "</head>"
+
+
+def buffered(pieces: Iterable[str], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Joins the many small strings Jinja's `generate()` yields into chunks of about
+    `chunk_bytes`. The document up to `</head>` goes out on its own first, so the
+    browser can fetch CSS and fonts while the rest of the page renders.
+    """
+    buffer: list[str] = []
+    size = 0
+    head_sent = False
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        head_done = not head_sent and HEAD_END in piece
+        if not head_done and size < chunk_bytes:
+            continue
+        head_sent = head_sent or head_done
+        yield "".join(buffer).encode("utf-8")
+        buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream_template(templates: Jinja2Templates, name: str, context: dict[str, Any], status_code: int = 200) -> StreamingResponse:
+    """Like `templates.TemplateResponse`, but sends the page while it is still rendering."""
+    template = templates.get_template(name)
+    return StreamingResponse(buffered(template.generate(context)), status_code=status_code, media_type="text/html")
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import String, event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapped, ORMExecuteState, mapped_column, with_loader_criteria
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.database import SessionLocal
+
+SITE_KEY_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+HOSTS_TOPIC = "site_hosts"
+
+_current_site: ContextVar[str] = ContextVar("current_site", default=settings.default_site_key)
+# Replaced as a whole on every reload, so request threads read them without a lock.
+_hosts: dict[str, str] = {}
+_sites: frozenset[str] = frozenset({settings.default_site_key})
+_watching = False
+
+
+def current_site() -> str:
+    return _current_site.get()
+
+
+@contextmanager
+def use_site(key: str) -> Iterator[str]:
+    token = _current_site.set(key)
+    try:
+        yield key
+    finally:
+        _current_site.reset(token)
+
+
+class TenantScoped:
+    """
+    Mixin for tables that hold one row set per site. ORM queries only see the rows of
+    `current_site()`, and new rows are stamped with it.
+    """
+
+    site_key: Mapped[str] = mapped_column(String(40), default=current_site, index=True)
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _scope_to_site(state: ORMExecuteState) -> None:
+    if state.is_column_load or state.is_relationship_load or state.execution_options.get("all_sites"):
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        site = current_site()
+        state.statement = state.statement.options(
+            with_loader_criteria(TenantScoped, lambda cls: cls.site_key == site, include_aliases=True)
+        )
+
+
+def normalize_host(value: str) -> str:
+    host = value.strip().lower()
+    if host.startswith("["):
+        return host.partition("]")[0] + "]"
+    return host.partition(":")[0].rstrip(".")
+
+
+def resolve_site(host: str) -> str:
+    """Site key for a Host header; unknown hosts get the default site."""
+    return _hosts.get(normalize_host(host), settings.default_site_key)
+
+
+def known_sites() -> frozenset[str]:
+    return _sites
+
+
+def site_hosts(key: str) -> list[str]:
+    return sorted(host for host, site in _hosts.items() if site == key)
+
+
+def load_hosts(engine: Engine) -> None:
+    global _hosts, _sites
+    from app.models import SiteHost
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(SiteHost.host, SiteHost.site_key)).all()
+    _hosts = {host: key for host, key in rows}
+    _sites = frozenset({settings.default_site_key, *_hosts.values()})
+
+
+def watch_hosts(engine: Engine) -> None:
+    """Loads the host index and reloads it whenever another process changes `site_hosts`."""
+    global _watching
+    from app.invalidation import subscribe
+
+    load_hosts(engine)
+    if not _watching:
+        subscribe(lambda topic, _version: load_hosts(engine) if topic == HOSTS_TOPIC else None)
+        _watching = True
+
+
+def backfill_site_keys(engine: Engine) -> None:
+    # Rows written before tenancy existed belong to the default site.
+    with engine.begin() as conn:
+        for model in TenantScoped.__subclasses__():
+            table = model.__table__
+            conn.execute(table.update().where(table.c.site_key.is_(None)).values(site_key=settings.default_site_key))
+
+
+def owns_media(path: str) -> bool:
+    """Uploads live under `<site>/`; the default site also owns files from before tenancy."""
+    first = path.partition("/")[0]
+    site = current_site()
+    return first == site or (site == settings.default_site_key and first not in _sites)
+
+
+class TenantMiddleware:
+    """Resolves the site from the Host header for everything downstream, with one dict lookup."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in {"http", "websocket"}:
+            await self.app(scope, receive, send)
+            return
+        host = next((value for name, value in scope["headers"] if name == b"host"), b"")
+        with use_site(resolve_site(host.decode("latin-1"))):
+            await self.app(scope, receive, send)
+
+
+def _seed_site(key: str) -> None:
+    from app.derived import backfill_derived_fields
+    from app.seed import seed_initial_data
+
+    with use_site(key):
+        db = SessionLocal()
+        try:
+            seed_initial_data(db)
+            backfill_derived_fields(db)
+        finally:
+            db.close()
+
+
+def seed_sites() -> None:
+    for key in sorted(_sites):
+        _seed_site(key)
+
+
+def add_hosts(key: str, hosts: list[str]) -> list[str]:
+    from app.models import SiteHost
+
+    if not SITE_KEY_RE.match(key):
+        raise ValueError(f"Invalid site key {key!r}: use lowercase letters, digits and dashes")
+    db = SessionLocal()
+    try:
+        added = []
+        for host in {normalize_host(host) for host in hosts}:
+            existing = db.get(SiteHost, host)
+            if existing and existing.site_key != key:
+                raise ValueError(f"{host} already belongs to site {existing.site_key!r}")
+            if not existing:
+                db.add(SiteHost(host=host, site_key=key))
+                added.append(host)
+        db.commit()
+    finally:
+        db.close()
+    _seed_site(key)
+    return sorted(added)
+
+
+def remove_hosts(hosts: list[str]) -> list[str]:
+    from app.models import SiteHost
+
+    db = SessionLocal()
+    try:
+        removed = []
+        for host in {normalize_host(host) for host in hosts}:
+            existing = db.get(SiteHost, host)
+            if existing:
+                db.delete(existing)
+                removed.append(host)
+        db.commit()
+    finally:
+        db.close()
+    return sorted(removed)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from app.database import engine
+    from app.main import prepare_database
+
+    parser = argparse.ArgumentParser(prog="python -m app.tenancy", description="Manage the sites served by this app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="route hosts to a site, creating its content if new")
+    add_parser.add_argument("site")
+    add_parser.add_argument("hosts", nargs="+")
+    remove_parser = commands.add_parser("remove", help="stop routing hosts; the site's content is kept")
+    remove_parser.add_argument("hosts", nargs="+")
+    commands.add_parser("list", help="show every host and its site")
+    args = parser.parse_args(argv)
+
+    prepare_database()
+    if args.command == "add":
+        try:
+            added = add_hosts(args.site, args.hosts)
+        except ValueError as exc:
+            sys.exit(str(exc))
+        print(f"Site {args.site}: added {', '.join(added) or 'no new hosts'}", file=sys.stderr)
+    elif args.command == "remove":
+        removed = remove_hosts(args.hosts)
+        print(f"Removed {', '.join(removed) or 'nothing'}", file=sys.stderr)
+    else:
+        load_hosts(engine)
+        for host, key in sorted(_hosts.items(), key=lambda item: (item[1], item[0])):
+            print(f"{key}\t{host}")
+        print(f"Other hosts serve {settings.default_site_key!r}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds.
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_ERROR = 2
+MAX_QUERY_CHARS = 1000
+EXPORT_BATCH = 512
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_exporter: Optional["SpanExporter"] = None
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """One timed operation in a trace, serialized as an OTLP/JSON span when it ends."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "_started", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: dict) -> None:
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.attributes["exception.type"] = type(exc).__name__
+        self.set_error(str(exc) or type(exc).__name__)
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, attributes)
+
+    def end(self) -> None:
+        exporter = _exporter
+        if exporter is None:
+            return
+        record = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + time.perf_counter_ns() - self._started),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+        }
+        if self.parent_id:
+            record["parentSpanId"] = self.parent_id
+        if self.error:
+            record["status"] = {"code": STATUS_ERROR, "message": self.error[:500]}
+        exporter.put(record)
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not sampled, so callers never branch."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Any]:
+    """
+    Times the block as a child of the current span. Outside a sampled request it does
+    nothing and yields a span whose setters are no-ops.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = parent.child(name, kind, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.record_exception(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def _sampled(trace_id: str) -> bool:
+    # Deterministic in the trace id, like OpenTelemetry's TraceIdRatioBased sampler.
+    return int(trace_id[16:], 16) < settings.trace_sample_rate * (1 << 64)
+
+
+def start_request_span(name: str, traceparent: str, **attributes: Any) -> Optional[Span]:
+    """
+    Root span for a request, or None when it is not sampled. An incoming W3C
+    `traceparent` decides for us, so traces started upstream stay whole.
+    """
+    match = TRACEPARENT_RE.match(traceparent.strip().lower()) if traceparent else None
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        if not int(flags, 16) & 1:
+            return None
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        if not _sampled(trace_id):
+            return None
+    return Span(name, trace_id, parent_id, KIND_SERVER, attributes)
+
+
+class TracingMiddleware:
+    """Opens a root span per sampled request; its id is returned in `traceresponse`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _exporter is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {name: value for name, value in scope["headers"] if name in {b"traceparent", b"host"}}
+        root = start_request_span(
+            f"{scope['method']} {scope['path']}",
+            headers.get(b"traceparent", b"").decode("latin-1"),
+            **{
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+                "server.address": headers.get(b"host", b"").decode("latin-1"),
+            },
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_traced(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.set_error(f"HTTP {message['status']}")
+                MutableHeaders(scope=message)["traceresponse"] = f"00-{root.trace_id}-{root.span_id}-01"
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_traced)
+        except BaseException as exc:
+            root.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.name = f"{scope['method']} {route.path}"
+                root.set_attribute("http.route", route.path)
+            root.end()
+
+
+def _before_cursor_execute(conn, _cursor, statement, _parameters, context, _executemany) -> None:
+    parent = _current_span.get()
+    if parent is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    context._trace_span = parent.child(
+        operation,
+        KIND_CLIENT,
+        **{
+            "db.system.name": conn.dialect.name,
+            "db.operation.name": operation,
+            "db.query.text": statement[:MAX_QUERY_CHARS],
+        },
+    )
+
+
+def _after_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+    db_span = getattr(context, "_trace_span", None)
+    if db_span is not None:
+        context._trace_span = None
+        db_span.end()
+
+
+def _handle_error(exception_context) -> None:
+    context = exception_context.execution_context
+    db_span = getattr(context, "_trace_span", None) if context is not None else None
+    if db_span is not None:
+        context._trace_span = None
+        db_span.record_exception(exception_context.original_exception)
+        db_span.end()
+
+
+def _traced_template_class(base: type) -> type:
+    class TracedTemplate(base):
+        def render(self, *args, **kwargs):
+            with span(f"render {self.name}", **{"template.name": self.name}):
+                return super().render(*args, **kwargs)
+
+        def generate(self, *args, **kwargs):
+            # Streamed pages render one piece per call, possibly on different threads,
+            # so the span is made current only while each piece is produced.
+            parent = _current_span.get()
+            pieces = super().generate(*args, **kwargs)
+            if parent is None:
+                yield from pieces
+                return
+            render_span = parent.child(f"render {self.name}", **{"template.name": self.name})
+            try:
+                while True:
+                    token = _current_span.set(render_span)
+                    try:
+                        piece = next(pieces)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current_span.reset(token)
+                    yield piece
+            except BaseException as exc:
+                render_span.record_exception(exc)
+                raise
+            finally:
+                render_span.end()
+
+    return TracedTemplate
+
+
+def instrument(template_env) -> None:
+    """
+    Adds spans for SQL statements on every engine and for Jinja renders. Does nothing
+    unless TRACE_SAMPLE_RATE is above zero, so untraced deployments pay nothing.
+    """
+    if settings.trace_sample_rate <= 0 or event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    template_env.template_class = _traced_template_class(template_env.template_class)
+    template_env.cache.clear()
+
+
+def _export_request(spans: list[dict]) -> dict:
+    """An OTLP `ExportTraceServiceRequest` in its JSON encoding."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        _attribute("service.name", settings.trace_service_name),
+                        _attribute("process.pid", os.getpid()),
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def _collector_url(target: str) -> str:
+    return target if target.rstrip("/").endswith("/v1/traces") else target.rstrip("/") + "/v1/traces"
+
+
+class SpanExporter(threading.Thread):
+    """
+    Collects finished spans and sends them in batches every `trace_export_interval`
+    seconds: appended as OTLP/JSON lines to a file, or POSTed to an OTLP/HTTP collector
+    when TRACE_EXPORT is a URL. Spans are dropped, never waited on, when the queue is full.
+    """
+
+    def __init__(self, target: str) -> None:
+        super().__init__(name="trace-exporter", daemon=True)
+        self.target = target
+        self.spans: queue.Queue = queue.Queue(maxsize=settings.trace_queue_size)
+        self.stopped = threading.Event()
+        self.dropped = 0
+
+    def put(self, record: dict) -> None:
+        try:
+            self.spans.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self) -> None:
+        while not self.stopped.wait(settings.trace_export_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join(settings.trace_export_interval + 1)
+        self.flush()
+
+    def flush(self) -> None:
+        while True:
+            batch = []
+            while len(batch) < EXPORT_BATCH:
+                try:
+                    batch.append(self.spans.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self._write(json.dumps(_export_request(batch), separators=(",", ":")))
+            except Exception:
+                logger.exception("Exporting %d spans to %s failed", len(batch), self.target)
+                return
+
+    def _write(self, body: str) -> None:
+        if self.target.startswith(("http://", "https://")):
+            # Imported here: most deployments export to a file or not at all.
+            import urllib.request
+
+            request = urllib.request.Request(
+                _collector_url(self.target),
+                data=body.encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+            return
+        with open(self.target, "a", encoding="utf-8") as out:
+            out.write(body + "\n")
+
+
+def start_tracing() -> None:
+    global _exporter
+    if settings.trace_sample_rate > 0 and _exporter is None:
+        _exporter = SpanExporter(settings.trace_export)
+        _exporter.start()
+
+
+def stop_tracing() -> None:
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.stop()
+        if exporter.dropped:
+            logger.warning("Dropped %d spans because the export queue was full", exporter.dropped)
+
+
+def _read_spans(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    yield from scope.get("spans", [])
+
+
+def show_traces(path: str, min_ms: float, out=sys.stdout) -> int:
+    """Prints each trace as an indented tree of spans with their durations."""
+    traces: dict[str, list[dict]] = {}
+    for record in _read_spans(path):
+        traces.setdefault(record["traceId"], []).append(record)
+
+    def duration_ms(record: dict) -> float:
+        return (int(record["endTimeUnixNano"]) - int(record["startTimeUnixNano"])) / 1e6
+
+    shown = 0
+    for trace_id, records in traces.items():
+        ids = {record["spanId"] for record in records}
+        roots = [record for record in records if record.get("parentSpanId") not in ids]
+        if max(duration_ms(record) for record in roots) < min_ms:
+            continue
+        children: dict[str, list[dict]] = {}
+        for record in records:
+            children.setdefault(record.get("parentSpanId"), []).append(record)
+
+        def walk(record: dict, depth: int) -> None:
+            attributes = {item["key"]: next(iter(item["value"].values())) for item in record.get("attributes", [])}
+            query = " ".join(attributes.get("db.query.text", "").split())
+            detail = f"  {query[:100]}" if query else ""
+            if record.get("status", {}).get("code") == STATUS_ERROR:
+                detail += " ERROR " + record["status"].get("message", "")
+            out.write(f"{duration_ms(record):9.1f} ms  {'  ' * depth}{record['name']}{detail}\n")
+            for child in sorted(children.get(record["spanId"], []), key=lambda item: int(item["startTimeUnixNano"])):
+                walk(child, depth + 1)
+
+        out.write(f"trace {trace_id}\n")
+        for root in sorted(roots, key=lambda item: int(item["startTimeUnixNano"])):
+            walk(root, 0)
+        out.write("\n")
+        shown += 1
+    return shown
+
+
+def run_collector(port: int, path: str) -> None:
+    """Minimal OTLP/HTTP JSON receiver that appends each export to `path`, for local testing."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if self.path != "/v1/traces" or "json" not in self.headers.get("Content-Type", ""):
+                self.send_error(415 if self.path == "/v1/traces" else 404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                export = json.loads(body)
+            except ValueError:
+                self.send_error(400)
+                return
+            with lock, open(path, "a", encoding="utf-8") as out:
+                out.write(json.dumps(export, separators=(",", ":")) + "\n")
+            count = sum(len(scope.get("spans", [])) for resource in export.get("resourceSpans", []) for scope in resource.get("scopeSpans", []))
+            print(f"received {count} spans", file=sys.stderr)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Receiver)
+    print(f"Listening on http://127.0.0.1:{port}/v1/traces, writing to {path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tracing", description="Inspect exported request traces.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show_parser = commands.add_parser("show", help="print traces from an OTLP/JSON lines file as span trees")
+    show_parser.add_argument("path", nargs="?", default=settings.trace_export)
+    show_parser.add_argument("--min-ms", type=float, default=0, help="only traces at least this slow")
+    collector_parser = commands.add_parser("collector", help="run a local OTLP/HTTP JSON receiver")
+    collector_parser.add_argument("--port", type=int, default=4318)
+    collector_parser.add_argument("--out", default="collected-traces.jsonl")
+    args = parser.parse_args(argv)
+
+    if args.command == "collector":
+        run_collector(args.port, args.out)
+        return
+    if args.path.startswith(("http://", "https://")):
+        sys.exit("TRACE_EXPORT is a collector URL; pass the path of an exported file")
+    shown = show_traces(args.path, args.min_ms)
+    print(f"{shown} traces", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
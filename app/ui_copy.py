@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
 
 from sqlalchemy.orm import Session
 
+from app.database import primary_reads
+from app.invalidation import content_version
 from app.models import UiCopy
+from app.tenancy import current_site
 
 
 DEFAULT_UI_COPY: Dict[str, str] = {
@@ -63,20 +67,36 @@ DEFAULT_UI_COPY: Dict[str, str] = {
     "team_intro": "Profesionales con experiencia en contabilidad, fiscal y estrategia financiera.",
     "location_heading": "Estamos en el corazón financiero",
     "location_intro": "Visítanos en nuestras oficinas o agenda una reunión virtual con el equipo.",
+    "location_map_label": "Ver mapa",
     "learn_more_eyebrow": "Conocimiento",
     "learn_more_link_label": "Ver publicación",
+    "learn_more_play_label": "Reproducir video",
+    "learn_more_popular_title": "Lo más visto",
+    "learn_more_views_label": "vistas",
 }
 
 
-def get_ui_copy(db: Session) -> Dict[str, str]:
-    row = db.query(UiCopy).first()
+# Per site: (version, copy).
+_cached: Dict[str, Tuple[int, Mapping[str, str]]] = {}
+
+
+def get_ui_copy(db: Session) -> Mapping[str, str]:
+    site = current_site()
+    version = content_version(UiCopy.__tablename__)
+    cached = _cached.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with primary_reads(db):
+        row = db.query(UiCopy).first()
     data: Dict[str, Any] = {}
     if row and row.data:
         try:
             data = json.loads(row.data)
         except json.JSONDecodeError:
             data = {}
-    merged = {**DEFAULT_UI_COPY, **data}
+    merged = MappingProxyType({**DEFAULT_UI_COPY, **data})
+    _cached[site] = (version, merged)
     return merged
 
 
@@ -11,7 +11,11 @@ def whatsapp_link(number: str) -> str:
     return f"https://wa.me/{digits}"
 
 
-def youtube_embed_url(url: str) -> str:
+def split_key_points(text: str) -> list[str]:
+    return [point for point in (text or "").split("\n") if point.strip()]
+
+
+def youtube_video_id(url: str) -> str:
     if not url:
         return ""
     parsed = urlparse(url)
@@ -27,12 +31,25 @@ def youtube_embed_url(url: str) -> str:
             video_id = parsed.path.split("/embed/")[-1]
         elif parsed.path.startswith("/shorts/"):
             video_id = parsed.path.split("/shorts/")[-1]
+    return video_id
 
+
+def youtube_embed_url(url: str) -> str:
+    if not url:
+        return ""
+    video_id = youtube_video_id(url)
     if not video_id:
         return url
     return f"https://www.youtube.com/embed/{video_id}"
 
 
+def youtube_poster_url(url: str) -> str:
+    video_id = youtube_video_id(url)
+    if not video_id:
+        return ""
+    return f"https://i.ytimg.com/vi/{quote(video_id)}/hqdefault.jpg"
+
+
 def maps_embed_url(url: str, fallback_query: str = "Ciudad de Mexico, Mexico") -> str:
     if not url:
         return f"https://www.google.com/maps?q={quote(fallback_query)}&output=embed"
@@ -0,0 +1,140 @@
+"""
+Measures how long `import app.main` takes and how much memory it leaves behind, and
+fails when either goes over budget or a deferred dependency is imported eagerly.
+
+    python benchmarks/import_time.py [--runs 5] [--max-ms N] [--max-rss-mib N]
+    python benchmarks/import_time.py --record [--runs 9]
+
+Each run is a fresh interpreter with `-X importtime`; the median run is reported. The
+budgets default to the recorded baseline (import_time_baseline.json) times
+TIME_MARGIN and RSS_MARGIN. Import time varies a lot between machines, so CI on
+different hardware should pass --max-ms, or record its own baseline with --record.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "import_time_baseline.json"
+# Budgets are the baseline plus these margins: run-to-run noise on one machine is up to
+# about 25% for time, so anything past 50% is a real regression.
+TIME_MARGIN = 1.5
+RSS_MARGIN = 1.3
+# Imported on first use only; none of them may load with the app.
+DEFERRED_MODULES = ("firebase_admin", "google.cloud.storage", "passlib", "smtplib")
+
+CHILD = f"""
+import json, resource, sys
+import app.main
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "rss_kib": rss // 1024 if sys.platform == "darwin" else rss,
+    "eager": [name for name in {DEFERRED_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> tuple[int, list[tuple[str, int]]]:
+    """Returns app.main's cumulative microseconds and its direct imports with theirs."""
+    subtree: list[tuple[int, str, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _self_us, cumulative, name_field = line[len("import time:") :].split("|")
+        name = name_field.strip()
+        # One space after the bar, then two more per nesting level.
+        level = (len(name_field) - len(name_field.lstrip()) - 1) // 2
+        if level == 0:
+            if name == "app.main":
+                children = [(child, micros) for child_level, child, micros in subtree if child_level == 1]
+                return int(cumulative), children
+            subtree = []
+        else:
+            subtree.append((level, name, int(cumulative)))
+    raise RuntimeError("app.main did not appear in the -X importtime output")
+
+
+def measure_once(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us, children = parse_importtime(result.stderr)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report.update(total_ms=total_us / 1000, children=children)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help=f"default: baseline x {TIME_MARGIN}")
+    parser.add_argument("--max-rss-mib", type=float, help=f"default: baseline x {RSS_MARGIN}")
+    parser.add_argument("--top", type=int, default=10, help="direct imports of app.main to list")
+    parser.add_argument("--record", action="store_true", help=f"write the median as the new {BASELINE_PATH.name}")
+    args = parser.parse_args()
+
+    max_ms, max_rss = args.max_ms, args.max_rss_mib
+    if not args.record and (max_ms is None or max_rss is None):
+        if not BASELINE_PATH.exists():
+            sys.exit(f"No {BASELINE_PATH.name}: pass --max-ms and --max-rss-mib, or run with --record first")
+        baseline = json.loads(BASELINE_PATH.read_text())
+        max_ms = max_ms if max_ms is not None else baseline["import_ms"] * TIME_MARGIN
+        max_rss = max_rss if max_rss is not None else baseline["rss_mib"] * RSS_MARGIN
+
+    workdir = tempfile.mkdtemp(prefix="bench-import-")
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "DATABASE_URL": f"sqlite:///{workdir}/bench.db"}
+    env.pop("DATABASE_REPLICA_URL", None)
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+
+    runs = sorted((measure_once(env) for _ in range(args.runs)), key=lambda run: run["total_ms"])
+    median = runs[len(runs) // 2]
+    rss_mib = statistics.median(run["rss_kib"] for run in runs) / 1024
+
+    print(f"import app.main: {median['total_ms']:.0f} ms (median of {args.runs}), {rss_mib:.1f} MiB RSS\n")
+    print(f"{'slowest direct imports':32} {'ms':>8}")
+    for name, micros in sorted(median["children"], key=lambda child: child[1], reverse=True)[: args.top]:
+        print(f"{name:32} {micros / 1000:8.1f}")
+
+    if args.record:
+        if median["eager"]:
+            sys.exit(f"\nNot recorded: imported eagerly: {', '.join(median['eager'])}")
+        record = {
+            "import_ms": round(median["total_ms"], 1),
+            "rss_mib": round(rss_mib, 1),
+            "runs": args.runs,
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+            "recorded": date.today().isoformat(),
+        }
+        BASELINE_PATH.write_text(json.dumps(record, indent=2) + "\n")
+        print(f"\nrecorded baseline in {BASELINE_PATH.name}")
+        return
+
+    failures = []
+    if median["total_ms"] > max_ms:
+        failures.append(f"import took {median['total_ms']:.0f} ms, budget is {max_ms:.0f} ms")
+    if rss_mib > max_rss:
+        failures.append(f"RSS is {rss_mib:.1f} MiB, budget is {max_rss:.0f} MiB")
+    if median["eager"]:
+        failures.append(f"imported eagerly: {', '.join(median['eager'])}")
+    if failures:
+        sys.exit("\nOVER BUDGET: " + "; ".join(failures))
+    print("\nwithin budget")
+
+
+if __name__ == "__main__":
+    main()
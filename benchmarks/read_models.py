@@ -0,0 +1,114 @@
+"""
+Compares loading the public list pages' rows as ORM entities vs. read models.
+
+    python benchmarks/read_models.py [--posts 1000] [--rounds 200]
+
+Runs against a throwaway SQLite file, never the configured database.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = tempfile.mkdtemp(prefix="bench-read-models-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/bench.db"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+sys.path.insert(0, str(ROOT))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Post, Service, TeamMember  # noqa: E402
+from app.read_models import published_posts, service_cards, team_cards  # noqa: E402
+
+LONG_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+
+
+def seed(posts: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all(
+        Post(title=f"Publicación {i}", description=LONG_TEXT, content_type="image", content_url=f"/media/posts/{i}.jpg")
+        for i in range(posts)
+    )
+    db.add_all(
+        Service(title=f"Servicio {i}", description=LONG_TEXT, key_points=LONG_TEXT, key_points_items=["a", "b", "c"])
+        for i in range(12)
+    )
+    db.add_all(TeamMember(name=f"Integrante {i}", role="Contador", bio=LONG_TEXT) for i in range(12))
+    db.commit()
+    db.close()
+
+
+def orm_pages(db) -> int:
+    posts = db.query(Post).filter(Post.is_published == True).order_by(Post.created_at.desc()).all()
+    services = db.query(Service).order_by(Service.id).all()
+    team = db.query(TeamMember).order_by(TeamMember.id).all()
+    return len(posts) + len(services) + len(team)
+
+
+def read_model_pages(db) -> int:
+    return len(published_posts(db)) + len(service_cards(db)) + len(team_cards(db))
+
+
+def measure(loader, rounds: int) -> dict:
+    # Same lifecycle as a request: fresh session per load, closed afterwards.
+    def one_request() -> None:
+        db = SessionLocal()
+        try:
+            loader(db)
+        finally:
+            db.close()
+
+    for _ in range(3):
+        one_request()
+
+    gc.collect()
+    collections = sum(stat["collections"] for stat in gc.get_stats())
+    started = time.perf_counter()
+    for _ in range(rounds):
+        one_request()
+    elapsed = time.perf_counter() - started
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+
+    tracemalloc.start()
+    one_request()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ms_per_request": elapsed / rounds * 1000,
+        "peak_kib": peak / 1024,
+        "gc_collections": collections,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    seed(args.posts)
+    results = {"orm entities": measure(orm_pages, args.rounds), "read models": measure(read_model_pages, args.rounds)}
+
+    print(f"{args.posts} posts, 12 services, 12 team members; {args.rounds} rounds\n")
+    print(f"{'':14} {'ms/request':>11} {'peak KiB':>10} {'gc runs':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:14} {result['ms_per_request']:11.2f} {result['peak_kib']:10.0f} {result['gc_collections']:8d}"
+        )
+    orm, light = results["orm entities"], results["read models"]
+    print(
+        f"\nread models: {orm['ms_per_request'] / light['ms_per_request']:.1f}x faster, "
+        f"{orm['peak_kib'] / light['peak_kib']:.1f}x less peak memory"
+    )
+
+
+if __name__ == "__main__":
+    main()